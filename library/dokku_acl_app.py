@@ -1,7 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_utils import run_per_app, subprocess_check_output
 
 DOCUMENTATION = """
 ---
@@ -10,14 +10,34 @@ short_description: Manage access control list for a given dokku application
 options:
   app:
     description:
-      - The name of the app
-    required: True
+      - The name of the app (required unless `apps` is set)
+    required: False
     default: null
     aliases: []
   users:
     description:
-      - The list of users who can manage the app
-    required: True
+      - The list of users who can manage the app (required with `app`)
+    required: False
+    aliases: []
+  apps:
+    description:
+      - A map of apps to lists of users, to manage the ACLs of many apps in one
+        task. Apps are processed concurrently and an error on one app does not
+        stop the others.
+    required: False
+    default: {}
+    aliases: []
+  exclusive:
+    description:
+      - With the `present` state, remove users that are not listed
+    required: False
+    default: False
+    aliases: []
+  parallelism:
+    description:
+      - Maximum number of apps processed at the same time when using `apps`
+    required: False
+    default: 4
     aliases: []
   state:
     description:
@@ -43,48 +63,91 @@ EXAMPLES = """
     users:
       - leopold
     state: absent
+- name: set the exact list of users for many apps
+  dokku_acl_app:
+    apps:
+      hello-world:
+        - leopold
+        - gverdi
+      other-app:
+        - gverdi
+    exclusive: true
 """
 
 
-def dokku_acl_app_set(data):
-    is_error = True
-    has_changed = False
-    meta = {"present": False}
+def dokku_acl_app_reconcile(app, users, state, exclusive):
+    """Apply the ACL changes for a single app.
 
-    has_changed = False
+    Returns the list of changes made so far and the first error, if any.
+    """
+    changes = []
 
     # get users for app
-    command = "dokku acl:list {0}".format(data["app"])
+    command = "dokku acl:list {0}".format(app)
     output, error = subprocess_check_output(command, redirect_stderr=True)
-
     if error is not None:
-        meta["error"] = error
-        return (is_error, has_changed, meta)
+        return changes, error
 
-    users = set(output)
+    existing = set(output)
+    if state == "absent":
+        to_add = []
+        to_remove = [user for user in users if user in existing]
+    else:
+        to_add = [user for user in users if user not in existing]
+        to_remove = []
+        if exclusive:
+            to_remove = sorted(existing - set(users))
+
+    for action, targets in [("remove", to_remove), ("add", to_add)]:
+        for user in targets:
+            command = "dokku --quiet acl:{0} {1} {2}".format(action, app, user)
+            output, error = subprocess_check_output(command, redirect_stderr=True)
+            changes.append("{0}:{1}".format(action, user))
+            if error is not None:
+                return changes, error
 
-    if data["state"] == "absent":
-        for user in data["users"]:
-            if user not in users:
-                continue
+    return changes, None
 
-            command = "dokku --quiet acl:remove {0} {1}".format(data["app"], user)
-            output, error = subprocess_check_output(command)
-            has_changed = True
-            if error is not None:
-                meta["error"] = error
-                return (is_error, has_changed, meta)
-    else:
-        for user in data["users"]:
-            if user in users:
-                continue
 
-            command = "dokku --quiet acl:add {0} {1}".format(data["app"], user)
-            output, error = subprocess_check_output(command)
-            has_changed = True
-            if error is not None:
-                meta["error"] = error
-                return (is_error, has_changed, meta)
+def dokku_acl_app_set(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False}
+
+    if not data["apps"]:
+        changes, error = dokku_acl_app_reconcile(
+            data["app"], data["users"], data["state"], data["exclusive"]
+        )
+        has_changed = len(changes) > 0
+        if error is not None:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+
+        is_error = False
+        return (is_error, has_changed, meta)
+
+    meta.update({"changed": {}, "errors": {}})
+    apps = sorted(data["apps"].keys())
+
+    def reconcile(app):
+        return dokku_acl_app_reconcile(
+            app, data["apps"][app] or [], data["state"], data["exclusive"]
+        )
+
+    for app, (changes, error) in zip(
+        apps, run_per_app(reconcile, apps, parallelism=data["parallelism"])
+    ):
+        if changes:
+            meta["changed"][app] = changes
+        if error is not None:
+            meta["errors"][app] = error
+
+    has_changed = len(meta["changed"]) > 0
+    if len(meta["errors"]) > 0:
+        meta["error"] = "Unable to update the ACLs of: {0}".format(
+            ", ".join(sorted(meta["errors"].keys()))
+        )
+        return (is_error, has_changed, meta)
 
     is_error = False
     return (is_error, has_changed, meta)
@@ -92,8 +155,11 @@ def dokku_acl_app_set(data):
 
 def main():
     fields = {
-        "app": {"required": True, "type": "str"},
-        "users": {"required": True, "type": "list"},
+        "app": {"required": False, "type": "str"},
+        "users": {"required": False, "type": "list"},
+        "apps": {"required": False, "default": {}, "type": "dict"},
+        "exclusive": {"required": False, "default": False, "type": "bool"},
+        "parallelism": {"required": False, "default": 4, "type": "int"},
         "state": {
             "required": False,
             "default": "present",
@@ -102,7 +168,13 @@ def main():
         },
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["app", "apps"]],
+        required_together=[["app", "users"]],
+        mutually_exclusive=[["app", "apps"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = dokku_acl_app_set(module.params)
 
     if is_error:
@@ -1,7 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_utils import run_concurrently, subprocess_check_output
 
 DOCUMENTATION = """
 ---
@@ -10,8 +10,8 @@ short_description: Manage access control list for a given dokku service
 options:
   service:
     description:
-      - The name of the service
-    required: True
+      - The name of the service (required unless `services` is set)
+    required: False
     default: null
     aliases: []
   type:
@@ -22,8 +22,28 @@ options:
     aliases: []
   users:
     description:
-      - The list of users who can manage the service
-    required: True
+      - The list of users who can manage the service (required with `service`)
+    required: False
+    aliases: []
+  services:
+    description:
+      - A map of service names to lists of users, to manage the ACLs of many
+        services of the same type in one task. Services are processed
+        concurrently and an error on one service does not stop the others.
+    required: False
+    default: {}
+    aliases: []
+  exclusive:
+    description:
+      - With the `present` state, remove users that are not listed
+    required: False
+    default: False
+    aliases: []
+  parallelism:
+    description:
+      - Maximum number of services processed at the same time when using `services`
+    required: False
+    default: 4
     aliases: []
   state:
     description:
@@ -51,54 +71,102 @@ EXAMPLES = """
     users:
       - leopold
     state: absent
+- name: set the exact list of users for many postgres services
+  dokku_acl_service:
+    type: postgres
+    services:
+      mypostgres:
+        - leopold
+      otherpostgres:
+        - leopold
+        - gverdi
+    exclusive: true
 """
 
 
-def dokku_acl_service_set(data):
-    is_error = True
-    has_changed = False
-    meta = {"present": False}
+def dokku_acl_service_reconcile(service_type, service, users, state, exclusive):
+    """Apply the ACL changes for a single service.
 
-    has_changed = False
+    Returns the list of changes made so far and the first error, if any.
+    """
+    changes = []
 
     # get users for service
-    command = "dokku --quiet acl:list-service {0} {1}".format(
-        data["type"], data["service"]
-    )
+    command = "dokku --quiet acl:list-service {0} {1}".format(service_type, service)
     output, error = subprocess_check_output(command, redirect_stderr=True)
-
     if error is not None:
-        meta["error"] = error
-        return (is_error, has_changed, meta)
-
-    users = set(output)
-
-    if data["state"] == "absent":
-        for user in data["users"]:
-            if user not in users:
-                continue
+        return changes, error
 
-            command = "dokku --quiet acl:remove-service {0} {1} {2}".format(
-                data["type"], data["service"], user
-            )
-            output, error = subprocess_check_output(command)
-            has_changed = True
-            if error is not None:
-                meta["error"] = error
-                return (is_error, has_changed, meta)
+    existing = set(output)
+    if state == "absent":
+        to_add = []
+        to_remove = [user for user in users if user in existing]
     else:
-        for user in data["users"]:
-            if user in users:
-                continue
-
-            command = "dokku --quiet acl:add-service {0} {1} {2}".format(
-                data["type"], data["service"], user
+        to_add = [user for user in users if user not in existing]
+        to_remove = []
+        if exclusive:
+            to_remove = sorted(existing - set(users))
+
+    for action, targets in [("remove", to_remove), ("add", to_add)]:
+        for user in targets:
+            command = "dokku --quiet acl:{0}-service {1} {2} {3}".format(
+                action, service_type, service, user
             )
             output, error = subprocess_check_output(command, redirect_stderr=True)
-            has_changed = True
+            changes.append("{0}:{1}".format(action, user))
             if error is not None:
-                meta["error"] = error
-                return (is_error, has_changed, meta)
+                return changes, error
+
+    return changes, None
+
+
+def dokku_acl_service_set(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False}
+
+    if not data["services"]:
+        changes, error = dokku_acl_service_reconcile(
+            data["type"],
+            data["service"],
+            data["users"],
+            data["state"],
+            data["exclusive"],
+        )
+        has_changed = len(changes) > 0
+        if error is not None:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+
+        is_error = False
+        return (is_error, has_changed, meta)
+
+    meta.update({"changed": {}, "errors": {}})
+    services = sorted(data["services"].keys())
+
+    def reconcile(service):
+        return dokku_acl_service_reconcile(
+            data["type"],
+            service,
+            data["services"][service] or [],
+            data["state"],
+            data["exclusive"],
+        )
+
+    for service, (changes, error) in zip(
+        services, run_concurrently(reconcile, services, data["parallelism"])
+    ):
+        if changes:
+            meta["changed"][service] = changes
+        if error is not None:
+            meta["errors"][service] = error
+
+    has_changed = len(meta["changed"]) > 0
+    if len(meta["errors"]) > 0:
+        meta["error"] = "Unable to update the ACLs of: {0}".format(
+            ", ".join(sorted(meta["errors"].keys()))
+        )
+        return (is_error, has_changed, meta)
 
     is_error = False
     return (is_error, has_changed, meta)
@@ -106,9 +174,12 @@ def dokku_acl_service_set(data):
 
 def main():
     fields = {
-        "service": {"required": True, "type": "str"},
+        "service": {"required": False, "type": "str"},
         "type": {"required": True, "type": "str"},
-        "users": {"required": True, "type": "list"},
+        "users": {"required": False, "type": "list"},
+        "services": {"required": False, "default": {}, "type": "dict"},
+        "exclusive": {"required": False, "default": False, "type": "bool"},
+        "parallelism": {"required": False, "default": 4, "type": "int"},
         "state": {
             "required": False,
             "default": "present",
@@ -117,7 +188,13 @@ def main():
         },
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["service", "services"]],
+        required_together=[["service", "users"]],
+        mutually_exclusive=[["service", "services"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = dokku_acl_service_set(module.params)
 
     if is_error:
@@ -4,7 +4,15 @@ from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.dokku_app import (
     dokku_app_ensure_present,
     dokku_app_ensure_absent,
+    dokku_apps_index,
 )
+from ansible.module_utils.dokku_service import dokku_service_links, dokku_service_list
+from ansible.module_utils.dokku_utils import (
+    run_concurrently,
+    run_per_app,
+    subprocess_error,
+)
+import subprocess
 
 DOCUMENTATION = """
 ---
@@ -14,9 +22,30 @@ options:
   app:
     description:
       - The name of the app
-    required: True
+    required: False
     default: null
     aliases: []
+  apps:
+    description:
+      - A list of apps to create or destroy in a single task, instead of `app`
+    required: False
+    default: []
+    aliases: []
+  services:
+    description:
+      - >
+        Service types (e.g. `postgres`, `redis`) whose services are unlinked
+        from the apps before they are destroyed, without restarting the apps.
+        The services of all apps are looked up and unlinked concurrently.
+    required: False
+    default: []
+    aliases: []
+  parallelism:
+    description:
+      - Maximum number of apps created, unlinked or destroyed at the same time
+    required: False
+    default: 4
+    aliases: []
   state:
     description:
       - The state of the app
@@ -37,12 +66,126 @@ EXAMPLES = """
   dokku_app:
     app: hello-world
     state: absent
+
+- name: Create several dokku apps
+  dokku_app:
+    apps:
+      - hello-world
+      - other-app
+
+- name: Unlink the databases of several apps and delete them
+  dokku_app:
+    apps:
+      - hello-world
+      - other-app
+    services:
+      - postgres
+    state: absent
 """
 
 
+def dokku_app_service_links(services, apps, parallelism):
+    """Get the services linked to `apps` as a map of app => [(type, name)]."""
+    candidates = []
+    for service in services:
+        names, error = dokku_service_list(service)
+        if error:
+            return None, error
+        candidates.extend((service, name) for name in sorted(names))
+
+    links = {}
+    results = run_concurrently(
+        lambda candidate: dokku_service_links(*candidate), candidates, parallelism
+    )
+    for candidate, (linked, error) in zip(candidates, results):
+        if error:
+            return None, error
+        for app in linked & set(apps):
+            links.setdefault(app, []).append(candidate)
+    return links, None
+
+
+def dokku_app_destroy(app, links, state):
+    """Unlink the services of an app, then destroy it."""
+    for service, name in links:
+        command = "dokku --quiet {0}:unlink --no-restart {1} {2}".format(
+            service, name, app
+        )
+        try:
+            subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+        except subprocess.CalledProcessError as e:
+            return None, subprocess_error(e)
+
+    return state(app)
+
+
+def dokku_app_bulk(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": data["state"] == "absent", "changed": [], "errors": {}}
+
+    # a single apps:list tells which apps need a change
+    existing, error = dokku_apps_index()
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    apps = data["apps"] or [data["app"]]
+    if data["state"] == "present":
+        apps = sorted(set(app for app in apps if app not in existing))
+    else:
+        apps = sorted(set(app for app in apps if app in existing))
+
+    ensure = {
+        "present": dokku_app_ensure_present,
+        "absent": dokku_app_ensure_absent,
+    }[data["state"]]
+
+    def state(app):
+        is_error, has_changed, result = ensure({"app": app})
+        return has_changed, result["error"] if is_error else None
+
+    links = {}
+    if data["state"] == "absent" and data["services"] and apps:
+        links, error = dokku_app_service_links(
+            data["services"], apps, data["parallelism"]
+        )
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+
+    def apply(app):
+        if data["state"] == "absent":
+            return dokku_app_destroy(app, links.get(app, []), state)
+        return state(app)
+
+    for app, (changed, error) in zip(
+        apps, run_per_app(apply, apps, parallelism=data["parallelism"])
+    ):
+        if changed:
+            meta["changed"].append(app)
+        if error is not None:
+            meta["errors"][app] = error
+
+    has_changed = len(meta["changed"]) > 0
+    if len(meta["errors"]) > 0:
+        meta["error"] = "Unable to {0}: {1}".format(
+            "create" if data["state"] == "present" else "destroy",
+            ", ".join(sorted(meta["errors"].keys())),
+        )
+        return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = data["state"] == "present"
+    return (is_error, has_changed, meta)
+
+
 def main():
     fields = {
-        "app": {"required": True, "type": "str"},
+        "app": {"required": False, "type": "str"},
+        "apps": {"required": False, "default": [], "type": "list"},
+        "services": {"required": False, "default": [], "type": "list"},
+        "parallelism": {"required": False, "default": 4, "type": "int"},
         "state": {
             "required": False,
             "default": "present",
@@ -55,10 +198,18 @@ def main():
         "absent": dokku_app_ensure_absent,
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
-    is_error, has_changed, result = choice_map.get(module.params["state"])(
-        module.params
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["app", "apps"]],
+        mutually_exclusive=[["app", "apps"]],
+        supports_check_mode=False,
     )
+    if module.params["apps"] or module.params["services"]:
+        is_error, has_changed, result = dokku_app_bulk(module.params)
+    else:
+        is_error, has_changed, result = choice_map.get(module.params["state"])(
+            module.params
+        )
 
     if is_error:
         module.fail_json(msg=result["error"], meta=result)
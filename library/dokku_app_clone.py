@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_app import (
+    dokku_app_clone,
+    dokku_app_ensure_absent,
+    dokku_apps_exists,
+)
+from ansible.module_utils.dokku_git import dokku_git_sha
+from ansible.module_utils.dokku_utils import subprocess_check_output, subprocess_error
+import json
+import pipes
+import subprocess
+
+DOCUMENTATION = """
+---
+module: dokku_app_clone
+short_description: Create an app from a template app and deploy the image of the template
+description:
+  - >
+    Clones a template app with `apps:clone --skip-deploy`, applies config and
+    domain overrides, then deploys the image already built for the template
+    with `git:from-image` instead of building the app again. Useful for
+    short-lived preview apps.
+options:
+  app:
+    description:
+      - The name of the app to create
+    required: True
+    default: null
+    aliases: []
+  template:
+    description:
+      - The name of the app to clone (required for 'present' state)
+    required: False
+    default: null
+    aliases: []
+  image:
+    description:
+      - The image to deploy. Defaults to the latest image built for the template.
+    required: False
+    default: dokku/<template>:latest
+    aliases: []
+  config:
+    description:
+      - A map of environment variables overriding the config cloned from the template
+    required: False
+    default: {}
+    aliases: []
+  domains:
+    description:
+      - The domains of the app, replacing the domains cloned from the template
+    required: False
+    default: null
+    aliases: []
+  deploy:
+    description:
+      - Whether to deploy the image
+    required: False
+    default: True
+    aliases: []
+  state:
+    description:
+      - The state of the app
+    required: False
+    default: present
+    choices: [ "present", "absent" ]
+    aliases: []
+author: Jose Diaz-Gonzalez
+requirements: [ ]
+"""
+
+EXAMPLES = """
+- name: Create a preview app from the staging app
+  dokku_app_clone:
+    app: preview-pr-42
+    template: staging
+    config:
+      DATABASE_URL: postgres://preview-pr-42
+    domains:
+      - pr-42.preview.example.com
+
+- name: Delete the preview app
+  dokku_app_clone:
+    app: preview-pr-42
+    state: absent
+"""
+
+
+def dokku_app_clone_config(data):
+    """Set the config overrides that differ with a single `config:set`.
+
+    Returns whether the config changed and the error, if any.
+    """
+    if not data["config"]:
+        return False, None
+
+    command = "dokku config:export --format json {0}".format(data["app"])
+    output, error = subprocess_check_output(command, split=None)
+    if error is not None:
+        return False, error
+    try:
+        existing = json.loads(output)
+    except ValueError as e:
+        return False, str(e)
+
+    values = []
+    for key, value in sorted(data["config"].items()):
+        value = "" if value is None else str(value)
+        if existing.get(key) != value:
+            values.append("{0}={1}".format(key, pipes.quote(value)))
+    if not values:
+        return False, None
+
+    command = "dokku config:set --no-restart {0} {1}".format(
+        data["app"], " ".join(values)
+    )
+    try:
+        subprocess.check_call(command, shell=True)
+    except subprocess.CalledProcessError as e:
+        return False, str(e)
+    return True, None
+
+
+def dokku_app_clone_domains(data):
+    """Replace the domains of the app if they differ.
+
+    Returns whether the domains changed and the error, if any.
+    """
+    if data["domains"] is None:
+        return False, None
+
+    command = "dokku --quiet domains:report {0} --domains-app-vhosts".format(
+        data["app"]
+    )
+    existing, error = subprocess_check_output(command, split=" ")
+    if error is not None:
+        return False, error
+    if set(existing) == set(data["domains"]):
+        return False, None
+
+    command = "dokku --quiet domains:set {0} {1}".format(
+        data["app"], " ".join(pipes.quote(d) for d in data["domains"])
+    )
+    try:
+        subprocess.check_call(command, shell=True)
+    except subprocess.CalledProcessError as e:
+        return False, str(e)
+    return True, None
+
+
+def dokku_app_clone_present(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False, "changed": []}
+
+    if not data["template"]:
+        meta["error"] = "missing required arguments: template"
+        return (is_error, has_changed, meta)
+
+    exists, _error = dokku_apps_exists(data["app"])
+    if not exists:
+        error = dokku_app_clone(data["template"], data["app"])
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        has_changed = True
+        meta["changed"].append("cloned")
+
+    config_changed, error = dokku_app_clone_config(data)
+    if config_changed:
+        has_changed = True
+        meta["changed"].append("config")
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    domains_changed, error = dokku_app_clone_domains(data)
+    if domains_changed:
+        has_changed = True
+        meta["changed"].append("domains")
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    if data["deploy"]:
+        image = data["image"] or "dokku/{0}:latest".format(data["template"])
+        sha_old = dokku_git_sha(data["app"])
+        # the template image is deployed as is, nothing is built from source
+        command = "dokku git:from-image {0} {1}".format(data["app"], pipes.quote(image))
+        try:
+            subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+        except subprocess.CalledProcessError as e:
+            # dokku refuses to deploy an image that is already deployed
+            if "No changes detected, skipping git commit" not in str(e.output):
+                meta["error"] = subprocess_error(e)
+                return (is_error, has_changed, meta)
+
+        if dokku_git_sha(data["app"]) != sha_old:
+            has_changed = True
+            meta["changed"].append("deployed")
+        elif config_changed:
+            # an unchanged image is not deployed again, so apply the config
+            command = "dokku --quiet ps:restart {0}".format(data["app"])
+            try:
+                subprocess.check_call(command, shell=True)
+            except subprocess.CalledProcessError as e:
+                meta["error"] = str(e)
+                return (is_error, has_changed, meta)
+            meta["changed"].append("restarted")
+
+    is_error = False
+    meta["present"] = True
+    return (is_error, has_changed, meta)
+
+
+def main():
+    fields = {
+        "app": {"required": True, "type": "str"},
+        "template": {"required": False, "type": "str"},
+        "image": {"required": False, "type": "str"},
+        "config": {"required": False, "default": {}, "type": "dict", "no_log": True},
+        "domains": {"required": False, "type": "list"},
+        "deploy": {"required": False, "default": True, "type": "bool"},
+        "state": {
+            "required": False,
+            "default": "present",
+            "choices": ["present", "absent"],
+            "type": "str",
+        },
+    }
+    choice_map = {
+        "present": dokku_app_clone_present,
+        "absent": dokku_app_ensure_absent,
+    }
+
+    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    is_error, has_changed, result = choice_map.get(module.params["state"])(
+        module.params
+    )
+
+    if is_error:
+        module.fail_json(msg=result["error"], meta=result)
+    module.exit_json(changed=has_changed, meta=result)
+
+
+if __name__ == "__main__":
+    main()
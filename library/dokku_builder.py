@@ -3,6 +3,7 @@
 import subprocess
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_utils import dokku_report_value, dokku_value_str
 
 DOCUMENTATION = """
 ---
@@ -18,7 +19,7 @@ options:
   property:
     description:
       - The property to be changed (e.g., `build-dir`, `selected`)
-    required: True
+    required: False
     aliases: []
   value:
     description:
@@ -31,6 +32,12 @@ options:
     required: False
     default: False
     aliases: []
+  properties:
+    description:
+      - A map of builder properties to values, to set several properties in one task
+    required: False
+    default: {}
+    aliases: []
 author: Simo Aleksandrov
 """
 
@@ -54,50 +61,69 @@ EXAMPLES = """
     global: true
     property: selected
     value: herokuish
+- name: Setting several builder properties
+  dokku_builder:
+    app: monorepo
+    properties:
+      selected: dockerfile
+      build-dir: backend
 """
 
 
 def dokku_builder(data):
     is_error = True
     has_changed = False
-    meta = {"present": False}
+    meta = {"present": False, "changed": []}
 
     if data["global"] and data["app"]:
         is_error = True
         meta["error"] = 'When "global" is set to true, "app" must not be provided.'
         return (is_error, has_changed, meta)
 
-    # Check if "value" is set and evaluates to a non-empty string, otherwise use an empty string
-    value = data["value"] if "value" in data else None
-    if not value:
-        value = ""
-
-    command = "dokku builder:set {0} {1} {2}".format(
-        "--global" if data["global"] else data["app"],
-        data["property"],
-        value,
-    )
-
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
-        has_changed = True
-        meta["present"] = True
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
-
+    properties = dict(data["properties"] or {})
+    if data["property"]:
+        properties[data["property"]] = data["value"]
+
+    # global values are read from the report without an app
+    app = None if data["global"] else data["app"]
+    for prop, value in sorted(properties.items()):
+        # Use an empty string to unset the property
+        value = dokku_value_str(value)
+        if dokku_report_value("builder", prop, app) == value:
+            continue
+
+        command = "dokku builder:set {0} {1} {2}".format(
+            "--global" if data["global"] else data["app"],
+            prop,
+            value,
+        )
+        try:
+            subprocess.check_call(command, shell=True)
+            has_changed = True
+            meta["changed"].append(prop)
+        except subprocess.CalledProcessError as e:
+            meta["error"] = str(e)
+            return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = True
     return (is_error, has_changed, meta)
 
 
 def main():
     fields = {
         "app": {"required": False, "type": "str"},
-        "property": {"required": True, "type": "str"},
-        "value": {"required": False, "type": "str", "no_log": True},
+        "property": {"required": False, "type": "str"},
+        "value": {"required": False, "type": "raw", "no_log": True},
         "global": {"required": False, "type": "bool"},
+        "properties": {"required": False, "default": {}, "type": "dict"},
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["property", "properties"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = dokku_builder(module.params)
 
     if is_error:
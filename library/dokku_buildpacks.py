@@ -56,25 +56,104 @@ def dokku_buildpacks(
     if actual == expected:
         return None, None
 
-    # OPTIMIZE: Instead of clearing and reconstructing the entire list, use
-    # indexed add/set/remove to only change entries as necessary.
-    if actual:
-        if not check_mode:
+    for operation, index, buildpack in dokku_buildpacks_edit_script(actual, expected):
+        if check_mode:
+            continue
+        if operation == "add":
+            error = dokku_buildpacks_add(app, buildpack, index)
+        elif operation == "set":
+            error = dokku_buildpacks_set(app, buildpack, index)
+        elif operation == "remove":
+            error = dokku_buildpacks_remove(app, buildpack)
+        else:
             error = dokku_buildpacks_clear(app)
-            if error is not None:
-                return error, None
-    for buildpack in expected:
-        if not check_mode:
-            error = dokku_buildpacks_add(app, buildpack)
-            if error is not None:
-                return error, None
+        if error is not None:
+            return error, None
 
     return None, {"before": "\n".join(actual), "after": "\n".join(expected)}
 
 
-def dokku_buildpacks_add(app: str, buildpack: str) -> Optional[str]:
-    command = "dokku --quiet buildpacks:add {} {}".format(
-        shell_escape(app), shell_escape(buildpack)
+def dokku_buildpacks_lcs(
+    actual: List[str], expected: List[str]
+) -> List[Tuple[int, int]]:
+    """Index pairs of a longest common subsequence of both lists."""
+    lengths = [[0] * (len(expected) + 1) for _ in range(len(actual) + 1)]
+    for i in range(len(actual) - 1, -1, -1):
+        for j in range(len(expected) - 1, -1, -1):
+            if actual[i] == expected[j]:
+                lengths[i][j] = lengths[i + 1][j + 1] + 1
+            else:
+                lengths[i][j] = max(lengths[i + 1][j], lengths[i][j + 1])
+
+    pairs = []
+    i, j = 0, 0
+    while i < len(actual) and j < len(expected):
+        if actual[i] == expected[j]:
+            pairs.append((i, j))
+            i, j = i + 1, j + 1
+        elif lengths[i + 1][j] >= lengths[i][j + 1]:
+            i += 1
+        else:
+            j += 1
+    return pairs
+
+
+def dokku_buildpacks_edit_script(
+    actual: List[str], expected: List[str]
+) -> List[Tuple[str, Optional[int], Optional[str]]]:
+    """Operations turning `actual` into `expected`, with 1-based indexes.
+
+    Buildpacks kept in a longest common subsequence are left alone, the rest
+    is replaced in place with `set`, inserted with `add` or dropped with
+    `remove`. Falls back to `clear` and `add` when that takes fewer commands.
+    """
+    rebuild = [("add", None, buildpack) for buildpack in expected]
+    if actual:
+        rebuild.insert(0, ("clear", None, None))
+
+    # buildpacks are removed by url, which is ambiguous with duplicates
+    if len(set(actual)) != len(actual) or len(set(expected)) != len(expected):
+        return rebuild
+
+    pairs = dokku_buildpacks_lcs(actual, expected)
+
+    removals = []
+    operations = []
+    position = 0
+    i, j = 0, 0
+    for anchor_i, anchor_j in pairs + [(len(actual), len(expected))]:
+        removed, inserted = actual[i:anchor_i], expected[j:anchor_j]
+        # moved buildpacks are removed and added again at their new index
+        removals.extend(b for b in removed if b in expected)
+        removed = [b for b in removed if b not in expected]
+        # replacing in place is only safe for buildpacks not yet on the app
+        replaceable = [b for b in inserted if b not in actual][: len(removed)]
+        replaced = len(replaceable)
+        removals.extend(removed[replaced:])
+        for buildpack in inserted:
+            position += 1
+            if buildpack in replaceable:
+                operations.append(("set", position, buildpack))
+            else:
+                operations.append(("add", position, buildpack))
+        position += 1
+        i, j = anchor_i + 1, anchor_j + 1
+
+    # removing first leaves only kept and replaced buildpacks in the list
+    operations = [("remove", None, b) for b in removals] + operations
+
+    if len(rebuild) < len(operations):
+        return rebuild
+    return operations
+
+
+def dokku_buildpacks_add(
+    app: str, buildpack: str, index: Optional[int] = None
+) -> Optional[str]:
+    command = "dokku --quiet buildpacks:add {}{} {}".format(
+        "--index {} ".format(index) if index is not None else "",
+        shell_escape(app),
+        shell_escape(buildpack),
     )
 
     _, error = subprocess_check_output(command)
@@ -90,6 +169,26 @@ def dokku_buildpacks_clear(app: str) -> Optional[str]:
     return error
 
 
+def dokku_buildpacks_remove(app: str, buildpack: str) -> Optional[str]:
+    command = "dokku --quiet buildpacks:remove {} {}".format(
+        shell_escape(app), shell_escape(buildpack)
+    )
+
+    _, error = subprocess_check_output(command)
+
+    return error
+
+
+def dokku_buildpacks_set(app: str, buildpack: str, index: int) -> Optional[str]:
+    command = "dokku --quiet buildpacks:set --index {} {} {}".format(
+        index, shell_escape(app), shell_escape(buildpack)
+    )
+
+    _, error = subprocess_check_output(command)
+
+    return error
+
+
 def dokku_buildpacks_list(app: str) -> Union[Tuple[str, None], Tuple[None, List[str]]]:
     command = "dokku --quiet buildpacks:list {}".format(shell_escape(app))
 
@@ -0,0 +1,166 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_certs import (
+    dokku_cert_cache_load,
+    dokku_cert_cache_save,
+    dokku_cert_info,
+    dokku_global_cert_report,
+)
+import os
+
+DOCUMENTATION = """
+---
+module: dokku_certs_info
+short_description: Reports ssl certificate details for dokku apps.
+description:
+  - Reports subject, SANs, issuer and expiry of the ssl certificates of dokku apps
+    and, optionally, of the global certificate.
+  - Certificates are parsed directly from disk instead of running `certs:report`
+    for every app, with the `cryptography` python package when it is installed
+    and `openssl x509` otherwise. Parsed results are cached by file
+    modification time, except in check mode.
+  - Never changes anything on the server.
+options:
+  apps:
+    description:
+      - The apps to inspect. Defaults to every app with an ssl certificate.
+    required: False
+    default: []
+    aliases: []
+  global:
+    description:
+      - Whether to also inspect the certificate managed by the `dokku-global-cert` plugin
+    required: False
+    default: False
+    aliases: []
+  dokku_root:
+    description:
+      - The dokku home directory
+    required: False
+    default: /home/dokku
+    aliases: []
+  cache_file:
+    description:
+      - Path of the file used to cache parsed certificates (leave empty to disable caching)
+    required: False
+    default: /var/cache/ansible-dokku/certs.json
+    aliases: []
+  expiry_days:
+    description:
+      - Certificates expiring within this number of days are listed in `expiring`
+    required: False
+    default: 30
+    aliases: []
+author: Jose Diaz-Gonzalez
+requirements: [ ]
+"""
+
+EXAMPLES = """
+- name: Report certificates of all apps
+  dokku_certs_info:
+  register: dokku_certs
+
+- name: Report certificates of some apps and the global certificate
+  dokku_certs_info:
+    apps:
+      - hello-world
+      - other-app
+    global: true
+    expiry_days: 14
+  register: dokku_certs
+
+- name: Fail if any certificate is about to expire
+  assert:
+    that:
+      - dokku_certs.meta.expiring | length == 0
+"""
+
+
+def dokku_certs_info_apps(data):
+    if data["apps"]:
+        return data["apps"]
+
+    try:
+        entries = sorted(os.listdir(data["dokku_root"]))
+    except OSError:
+        return []
+
+    return [
+        app
+        for app in entries
+        if os.path.isfile(os.path.join(data["dokku_root"], app, "tls", "server.crt"))
+    ]
+
+
+def dokku_certs_info_global_dir():
+    report, error = dokku_global_cert_report()
+    if error is not None:
+        return None, error
+    if not report.get("dir"):
+        return None, "Unable to find the global certificate directory"
+    return report["dir"].strip(), None
+
+
+def dokku_certs_info(data, check_mode=False):
+    is_error = True
+    has_changed = False
+    meta = {"apps": {}, "global": None, "expiring": [], "errors": {}}
+
+    cache = dokku_cert_cache_load(data["cache_file"])
+
+    for app in dokku_certs_info_apps(data):
+        path = os.path.join(data["dokku_root"], app, "tls", "server.crt")
+        info, error = dokku_cert_info(path, cache)
+        if error:
+            meta["errors"][app] = error
+            continue
+        meta["apps"][app] = info
+        if info is not None and info["days_remaining"] < data["expiry_days"]:
+            meta["expiring"].append(app)
+
+    if data["global"]:
+        directory, error = dokku_certs_info_global_dir()
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+
+        info, error = dokku_cert_info(os.path.join(directory, "server.crt"), cache)
+        if error:
+            meta["errors"]["--global"] = error
+        meta["global"] = info
+        if info is not None and info["days_remaining"] < data["expiry_days"]:
+            meta["expiring"].append("--global")
+
+    if not check_mode:
+        error = dokku_cert_cache_save(data["cache_file"], cache)
+        if error:
+            meta["cache_error"] = error
+
+    is_error = False
+    return (is_error, has_changed, meta)
+
+
+def main():
+    fields = {
+        "apps": {"required": False, "default": [], "type": "list"},
+        "global": {"required": False, "default": False, "type": "bool"},
+        "dokku_root": {"required": False, "default": "/home/dokku", "type": "str"},
+        "cache_file": {
+            "required": False,
+            "default": "/var/cache/ansible-dokku/certs.json",
+            "type": "str",
+        },
+        "expiry_days": {"required": False, "default": 30, "type": "int"},
+    }
+
+    module = AnsibleModule(argument_spec=fields, supports_check_mode=True)
+    is_error, has_changed, result = dokku_certs_info(module.params, module.check_mode)
+
+    if is_error:
+        module.fail_json(msg=result["error"], meta=result)
+    module.exit_json(changed=has_changed, meta=result)
+
+
+if __name__ == "__main__":
+    main()
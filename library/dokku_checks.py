@@ -1,9 +1,11 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import json
+import pipes
 import subprocess
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_utils import dokku_report, subprocess_check_output
 
 DOCUMENTATION = """
 ---
@@ -16,6 +18,47 @@ options:
     required: True
     default: null
     aliases: []
+  disabled:
+    description:
+      - >
+        The process types whose checks are disabled. Process types missing from
+        both `disabled` and `skipped` are re-enabled. Only used when the state is
+        present, and left untouched when not set.
+    required: False
+    default: null
+    aliases: []
+  skipped:
+    description:
+      - >
+        The process types whose checks are skipped. Only used when the state is
+        present, and left untouched when not set.
+    required: False
+    default: null
+    aliases: []
+  wait:
+    description:
+      - Seconds to wait before running the checks (`DOKKU_CHECKS_WAIT`)
+    required: False
+    default: null
+    aliases: []
+  timeout:
+    description:
+      - Seconds before a single check attempt times out (`DOKKU_CHECKS_TIMEOUT`)
+    required: False
+    default: null
+    aliases: []
+  attempts:
+    description:
+      - Number of attempts before a check is considered failed (`DOKKU_CHECKS_ATTEMPTS`)
+    required: False
+    default: null
+    aliases: []
+  wait_to_retire:
+    description:
+      - Seconds to wait before the containers of the previous release are retired
+    required: False
+    default: null
+    aliases: []
   state:
     description:
       - The state of the checks functionality
@@ -36,77 +79,159 @@ EXAMPLES = """
   dokku_checks:
     app: hello-world
     state: present
-"""
 
+- name: Skip the checks of workers and tune the cutover
+  dokku_checks:
+    app: hello-world
+    disabled: []
+    skipped:
+      - worker
+    wait: 2
+    attempts: 3
+    wait_to_retire: 10
+"""
 
-def dokku_checks_enabled(data):
-    command = "dokku --quiet checks:report {0}"
-    response, error = subprocess_check_output(command.format(data["app"]))
-
-    if error:
+CONFIG_KEYS = {
+    "wait": "DOKKU_CHECKS_WAIT",
+    "timeout": "DOKKU_CHECKS_TIMEOUT",
+    "attempts": "DOKKU_CHECKS_ATTEMPTS",
+}
+
+
+def dokku_checks_process_types(value):
+    """Parse a `checks:report` process type list into a set."""
+    if not value or value == "none":
+        return set()
+    return set(p.strip() for p in value.split(",") if p.strip())
+
+
+def dokku_checks_process_types_commands(data, report):
+    """Get the `checks:*` commands turning the reported process type lists
+    into the requested ones."""
+    disabled = dokku_checks_process_types(report.get("disabled-list"))
+    skipped = dokku_checks_process_types(report.get("skipped-list"))
+
+    if data["state"] == "absent":
+        if "_all_" in disabled:
+            return [], None
+        return ["dokku --quiet checks:disable {0}".format(data["app"])], None
+
+    wanted_disabled = disabled if data["disabled"] is None else set(data["disabled"])
+    wanted_skipped = skipped if data["skipped"] is None else set(data["skipped"])
+    if data["disabled"] is None and "_all_" in disabled:
+        # checks disabled for every process type are enabled, as before
+        wanted_disabled = set()
+    overlap = wanted_disabled & wanted_skipped
+    if overlap:
+        error = "Process types cannot be both disabled and skipped: {0}"
+        return None, error.format(", ".join(sorted(overlap)))
+
+    commands = []
+    changed = disabled != wanted_disabled or skipped != wanted_skipped
+    if changed and ("_all_" in disabled or "_all_" in skipped):
+        # enabling every process type also clears both lists
+        commands.append("dokku --quiet checks:enable {0}".format(data["app"]))
+        disabled, skipped = set(), set()
+
+    changes = [
+        ("enable", (disabled | skipped) - wanted_disabled - wanted_skipped),
+        ("disable", wanted_disabled - disabled),
+        ("skip", wanted_skipped - skipped),
+    ]
+    for action, process_types in changes:
+        if process_types:
+            commands.append(
+                "dokku --quiet checks:{0} {1} {2}".format(
+                    action, data["app"], ",".join(sorted(process_types))
+                )
+            )
+    return commands, None
+
+
+def dokku_checks_config_command(data):
+    """Get the `config:set` command for the check timings that differ."""
+    wanted = {}
+    for name, key in CONFIG_KEYS.items():
+        if data[name] is not None:
+            wanted[key] = str(data[name])
+    if not wanted:
+        return None, None
+
+    command = "dokku config:export --format json {0}".format(data["app"])
+    output, error = subprocess_check_output(command, split=None)
+    if error is not None:
         return None, error
-
-    report = response[0].split(":")[1]
-    return report.strip() != "_all_", error
-
-
-def dokku_checks_present(data):
+    try:
+        existing = json.loads(output)
+    except ValueError as e:
+        return None, str(e)
+
+    values = [
+        "{0}={1}".format(key, pipes.quote(value))
+        for key, value in sorted(wanted.items())
+        if existing.get(key) != value
+    ]
+    if not values:
+        return None, None
+    command = "dokku config:set --no-restart {0} {1}"
+    return command.format(data["app"], " ".join(values)), None
+
+
+def dokku_checks_set(data):
     is_error = True
     has_changed = False
-    meta = {"present": False}
+    meta = {"present": data["state"] == "absent", "changed": []}
 
-    enabled, error = dokku_checks_enabled(data)
+    report, error = dokku_report("checks", data["app"])
     if error:
         meta["error"] = error
         return (is_error, has_changed, meta)
+    report = report.get(data["app"], {})
 
-    if enabled:
-        is_error = False
-        meta["present"] = True
-        return (is_error, has_changed, meta)
-
-    command = "dokku --quiet checks:enable {0}".format(data["app"])
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
-        has_changed = True
-        meta["present"] = True
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
-
-    return (is_error, has_changed, meta)
-
-
-def dokku_checks_absent(data=None):
-    is_error = True
-    has_changed = False
-    meta = {"present": True}
-
-    enabled, error = dokku_checks_enabled(data)
+    commands, error = dokku_checks_process_types_commands(data, report)
     if error:
         meta["error"] = error
         return (is_error, has_changed, meta)
 
-    if enabled is False:
-        is_error = False
-        meta["present"] = False
+    command, error = dokku_checks_config_command(data)
+    if error:
+        meta["error"] = error
         return (is_error, has_changed, meta)
-
-    command = "dokku --quiet checks:disable {0}".format(data["app"])
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
-        has_changed = True
-        meta["present"] = False
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
-
+    if command:
+        commands.append(command)
+
+    if data["wait_to_retire"] is not None:
+        value = str(data["wait_to_retire"])
+        if report.get("wait-to-retire") != value:
+            commands.append(
+                "dokku --quiet checks:set {0} wait-to-retire {1}".format(
+                    data["app"], value
+                )
+            )
+
+    for command in commands:
+        try:
+            subprocess.check_call(command, shell=True)
+            has_changed = True
+            meta["changed"].append(command)
+        except subprocess.CalledProcessError as e:
+            meta["error"] = str(e)
+            return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = data["state"] == "present"
     return (is_error, has_changed, meta)
 
 
 def main():
     fields = {
         "app": {"required": True, "type": "str"},
+        "disabled": {"required": False, "type": "list"},
+        "skipped": {"required": False, "type": "list"},
+        "wait": {"required": False, "type": "int"},
+        "timeout": {"required": False, "type": "int"},
+        "attempts": {"required": False, "type": "int"},
+        "wait_to_retire": {"required": False, "type": "int"},
         "state": {
             "required": False,
             "default": "present",
@@ -114,15 +239,9 @@ def main():
             "type": "str",
         },
     }
-    choice_map = {
-        "present": dokku_checks_present,
-        "absent": dokku_checks_absent,
-    }
 
     module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
-    is_error, has_changed, result = choice_map.get(module.params["state"])(
-        module.params
-    )
+    is_error, has_changed, result = dokku_checks_set(module.params)
 
     if is_error:
         module.fail_json(msg=result["error"], meta=result)
@@ -4,12 +4,20 @@ import subprocess
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.dokku_app import dokku_app_ensure_present
-from ansible.module_utils.dokku_git import dokku_git_sha
+from ansible.module_utils.dokku_git import (
+    dokku_git_deployed_sha,
+    dokku_git_ls_remote,
+    dokku_git_mirror_update,
+    dokku_git_sha,
+)
 
 DOCUMENTATION = """
 ---
 module: dokku_clone
 short_description: Clone a git repository and deploy app.
+description:
+  - The requested version is resolved with `git ls-remote` first. If it matches
+    the deployed commit, the app is neither synced nor rebuilt.
 options:
   app:
     description:
@@ -35,6 +43,26 @@ options:
     required: False
     default: true
     aliases: []
+  mirror:
+    description:
+      - Whether to sync from a local bare mirror of the repository, shared by
+        all apps deploying from the same repository url.
+    required: False
+    default: false
+    aliases: []
+  mirror_dir:
+    description:
+      - Directory holding the bare mirrors
+    required: False
+    default: /var/lib/dokku/data/git-mirrors
+    aliases: []
+  mirror_max_size:
+    description:
+      - Maximum size of the mirror directory in megabytes. The least recently
+        used mirrors are removed when it is exceeded.
+    required: False
+    default: 10240
+    aliases: []
 author: Jose Diaz-Gonzalez
 """
 
@@ -55,6 +83,11 @@ EXAMPLES = """
       app: example-app
       repository: https://github.com/heroku/node-js-getting-started
       build: false
+- name: clone git repository through the shared local mirror
+  dokku_clone:
+      app: example-app
+      repository: https://github.com/heroku/node-js-getting-started
+      mirror: true
 """
 
 
@@ -67,10 +100,30 @@ def dokku_clone(data):
         return (is_error, has_changed, meta)
 
     sha_old = dokku_git_sha(data["app"])
+    # a build is only skipped when the app is deployed at the requested commit
+    sha_current = dokku_git_deployed_sha(data["app"]) if data["build"] else sha_old
+    if sha_current:
+        sha_remote, _error = dokku_git_ls_remote(data["repository"], data["version"])
+        if sha_remote == sha_current:
+            meta["present"] = True
+            return (is_error, has_changed, meta)
+
+    repository = data["repository"]
+    if data["mirror"]:
+        repository, error = dokku_git_mirror_update(
+            data["repository"],
+            data["mirror_dir"],
+            data["mirror_max_size"] * 1024 * 1024,
+        )
+        if error:
+            is_error = True
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        repository = "file://{0}".format(repository)
 
     # sync with remote repository
     command_git_sync = "dokku git:sync {app} {repository}".format(
-        app=data["app"], repository=data["repository"]
+        app=data["app"], repository=repository
     )
     if data["version"]:
         command_git_sync += " {version}".format(version=data["version"])
@@ -102,6 +155,13 @@ def main():
         "repository": {"required": True, "type": "str"},
         "version": {"required": False, "type": "str"},
         "build": {"default": True, "required": False, "type": "bool"},
+        "mirror": {"default": False, "required": False, "type": "bool"},
+        "mirror_dir": {
+            "default": "/var/lib/dokku/data/git-mirrors",
+            "required": False,
+            "type": "str",
+        },
+        "mirror_max_size": {"default": 10240, "required": False, "type": "int"},
     }
 
     module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
@@ -1,10 +1,11 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_utils import dokku_report
 import pipes
-import subprocess
 import re
+import shlex
+import subprocess
 
 DOCUMENTATION = """
 ---
@@ -19,17 +20,31 @@ options:
     aliases: []
   option:
     description:
-      - A single docker option
-    required: True
+      - A single docker option (required unless `options` is set)
+    required: False
     default: null
     aliases: []
   phase:
     description:
-      - The phase in which to set the options
+      - The phase in which to set the options (required with `option`)
     required: False
     default: null
     choices: [ "build", "deploy", "run" ]
     aliases: []
+  options:
+    description:
+      - A map of phases (`build`, `deploy`, `run`) to lists of docker options,
+        to manage the options of several phases in one task
+    required: False
+    default: {}
+    aliases: []
+  exclusive:
+    description:
+      - When using `options` with the `present` state, remove any other option
+        from the listed phases
+    required: False
+    default: False
+    aliases: []
   state:
     description:
       - The state of the docker options
@@ -54,35 +69,177 @@ EXAMPLES = """
     phase: deploy
     option: "-v /var/run/docker.sock:/var/run/docker.sock"
     state: absent
+
+- name: docker-options for several phases, removing any other option
+  dokku_docker_options:
+    app: hello-world
+    options:
+      build:
+        - "--pull"
+      deploy:
+        - "-v /var/run/docker.sock:/var/run/docker.sock"
+        - "--restart=on-failure:10"
+      run:
+        - "-v /var/run/docker.sock:/var/run/docker.sock"
+    exclusive: true
 """
 
+PHASES = ["build", "deploy", "run"]
+
+# a shell word, quotes included
+RE_WORD = re.compile(r"""(?:[^\s'"]+|'[^']*'|"(?:\\.|[^"\\])*")+""")
+
+
+def dokku_docker_options_split(options):
+    """Split an options string into individual options, e.g. `-v /a:/b --pull`
+    into `("-v", "/a:/b")` and `("--pull",)`, each with its raw text.
+
+    Raises `ValueError` if the string cannot be parsed.
+    """
+    shlex.split(options)
+    split = []
+    for match in RE_WORD.finditer(options):
+        raw = match.group(0)
+        token = shlex.split(raw)[0]
+        if token.startswith("-") or len(split) == 0:
+            split.append(([token], [raw]))
+        else:
+            split[-1][0].append(token)
+            split[-1][1].append(raw)
+    return [(tuple(tokens), " ".join(raws)) for tokens, raws in split]
+
+
+def dokku_docker_options_key(option):
+    """Get the normalized options of an option string, e.g. `-v a:b --pull`
+    into `(("-v", "a:b"), ("--pull",))`."""
+    key = tuple(tokens for tokens, _raw in dokku_docker_options_split(option))
+    if len(key) == 0:
+        raise ValueError("empty docker option")
+    return key
+
+
+def dokku_docker_options_contains(existing, key):
+    """Whether all options of `key` are set next to each other in `existing`."""
+    keys = [tokens for tokens, _raw in existing]
+    for i in range(len(keys) - len(key) + 1):
+        if tuple(keys[i:][: len(key)]) == key:
+            return True
+    return False
+
+
+def dokku_docker_options_validate(data):
+    options = [] if data["option"] is None else [data["option"]]
+    for phase_options in (data["options"] or {}).values():
+        options.extend(phase_options or [])
+    for option in options:
+        try:
+            dokku_docker_options_key(str(option))
+        except ValueError as e:
+            return "Invalid docker option {0!r}: {1}".format(option, str(e))
+    return None
+
 
 def dokku_docker_options(data):
-    options = {"build": "", "deploy": "", "run": ""}
-    command = "dokku --quiet docker-options:report {0}".format(data["app"])
-    output, error = subprocess_check_output(command)
+    options = dict((phase, []) for phase in PHASES)
+    report, error = dokku_report("docker-options", data["app"])
     if error is None:
-        for line in output:
-            match = re.match(
-                "Docker options (?P<type>build|deploy|run):(?P<options>.+)",
-                line.strip(),
-            )
-            if match:
-                options[match.group("type")] = match.group("options").strip()
+        values = report.get(data["app"], {})
+        for phase in PHASES:
+            options[phase] = dokku_docker_options_split(values.get(phase, ""))
     return options, error
 
 
+def dokku_docker_options_apply(data, action, changes, meta):
+    """Run one add/remove per option, covering all of its phases at once."""
+    phases_by_option = {}
+    for phase, option in changes:
+        phases_by_option.setdefault(option, []).append(phase)
+
+    for option, phases in sorted(phases_by_option.items()):
+        command = "dokku --quiet docker-options:{0} {1} {2} {3}".format(
+            action, data["app"], ",".join(sorted(phases)), pipes.quote(option)
+        )
+        try:
+            subprocess.check_call(command, shell=True)
+        except subprocess.CalledProcessError as e:
+            return str(e)
+        meta[action].append(option)
+
+    return None
+
+
+def dokku_docker_options_bulk(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": data["state"] == "absent", "add": [], "remove": []}
+
+    unknown = [phase for phase in data["options"] if phase not in PHASES]
+    if unknown:
+        meta["error"] = "Unknown phases {0}, choose from: {1}".format(
+            ", ".join(unknown), ", ".join(PHASES)
+        )
+        return (is_error, has_changed, meta)
+
+    existing, error = dokku_docker_options(data)
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    to_add, to_remove = [], []
+    for phase, options in data["options"].items():
+        desired = [(dokku_docker_options_key(str(o)), str(o)) for o in options or []]
+        current = existing[phase]
+        if data["state"] == "absent":
+            to_remove += [
+                (phase, o)
+                for k, o in desired
+                if dokku_docker_options_contains(current, k)
+            ]
+            continue
+        to_add += [
+            (phase, o)
+            for k, o in desired
+            if not dokku_docker_options_contains(current, k)
+        ]
+        if data["exclusive"]:
+            # removed with their raw text, which is quoted once when applied
+            wanted = set(tokens for k, _o in desired for tokens in k)
+            to_remove += [
+                (phase, raw) for tokens, raw in current if tokens not in wanted
+            ]
+
+    for action, changes in [("remove", to_remove), ("add", to_add)]:
+        error = dokku_docker_options_apply(data, action, changes, meta)
+        has_changed = has_changed or len(meta[action]) > 0
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = data["state"] == "present"
+    return (is_error, has_changed, meta)
+
+
 def dokku_docker_options_absent(data):
     is_error = True
     has_changed = False
     meta = {"present": True}
 
+    error = dokku_docker_options_validate(data)
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    if data["options"]:
+        return dokku_docker_options_bulk(data)
+
     existing, error = dokku_docker_options(data)
     if error:
         meta["error"] = error
         return (is_error, has_changed, meta)
 
-    if data["option"] not in existing[data["phase"]]:
+    option = dokku_docker_options_key(data["option"])
+    if not dokku_docker_options_contains(existing[data["phase"]], option):
         is_error = False
         meta["present"] = False
         return (is_error, has_changed, meta)
@@ -106,12 +263,21 @@ def dokku_docker_options_present(data):
     has_changed = False
     meta = {"present": False}
 
+    error = dokku_docker_options_validate(data)
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    if data["options"]:
+        return dokku_docker_options_bulk(data)
+
     existing, error = dokku_docker_options(data)
     if error:
         meta["error"] = error
         return (is_error, has_changed, meta)
 
-    if data["option"] in existing[data["phase"]]:
+    option = dokku_docker_options_key(data["option"])
+    if dokku_docker_options_contains(existing[data["phase"]], option):
         is_error = False
         meta["present"] = True
         return (is_error, has_changed, meta)
@@ -140,18 +306,26 @@ def main():
             "type": "str",
         },
         "phase": {
-            "required": True,
+            "required": False,
             "choices": ["build", "deploy", "run"],
             "type": "str",
         },
-        "option": {"required": True, "type": "str"},
+        "option": {"required": False, "type": "str"},
+        "options": {"required": False, "default": {}, "type": "dict"},
+        "exclusive": {"required": False, "default": False, "type": "bool"},
     }
     choice_map = {
         "present": dokku_docker_options_present,
         "absent": dokku_docker_options_absent,
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["option", "options"]],
+        required_together=[["option", "phase"]],
+        mutually_exclusive=[["option", "options"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = choice_map.get(module.params["state"])(
         module.params
     )
@@ -1,10 +1,23 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_git import (
+    dokku_git_deployed_sha,
+    dokku_git_ls_remote_refs,
+    dokku_git_mirror_update,
+    dokku_git_resolve,
+    dokku_git_sha,
+)
+from ansible.module_utils.dokku_utils import (
+    run_concurrently,
+    run_per_app,
+    subprocess_check_output,
+    subprocess_error,
+)
 import pipes
 import re
 import subprocess
+import time
 
 DOCUMENTATION = """
 ---
@@ -14,9 +27,53 @@ options:
   app:
     description:
       - The name of the app
-    required: True
+    required: False
     default: null
     aliases: []
+  apps:
+    description:
+      - >
+        A list of apps to configure and sync in a single task, each with an
+        `app`, a `remote` and an optional `ref`. The refs of every remote are
+        listed once for all apps tracking it, apps already deployed at their
+        ref are skipped and the others are synced with `git:sync`, which
+        fetches the remote for each app unless `mirror` is set.
+    required: False
+    default: []
+    aliases: []
+  build:
+    description:
+      - Whether to build the apps synced through `apps`
+    required: False
+    default: False
+    aliases: []
+  mirror:
+    description:
+      - >
+        Whether apps synced through `apps` fetch from a shared local mirror of
+        their remote instead of fetching the remote once per app. The mirror
+        is fetched by the module user, which needs access to the remote.
+    required: False
+    default: False
+    aliases: []
+  mirror_dir:
+    description:
+      - Directory holding the local mirrors
+    required: False
+    default: /var/lib/dokku/data/git-mirrors
+    aliases: []
+  mirror_max_size:
+    description:
+      - Maximum total size of the local mirrors in MB, least recently used mirrors are evicted first
+    required: False
+    default: 10240
+    aliases: []
+  parallelism:
+    description:
+      - Maximum number of remotes fetched and apps synced at the same time
+    required: False
+    default: 4
+    aliases: []
   remote:
     description:
       - The git remote url to use
@@ -45,6 +102,16 @@ EXAMPLES = """
   dokku_git_sync:
     app: hello-world
     state: absent
+
+- name: git-sync and deploy several apps sharing a remote
+  dokku_git_sync:
+    apps:
+      - app: hello-world
+        remote: git@github.com:hello-world/hello-world.git
+      - app: hello-world-staging
+        remote: git@github.com:hello-world/hello-world.git
+        ref: staging
+    build: true
 """
 
 
@@ -250,10 +317,152 @@ def dokku_module_present(
     return (is_error, has_changed, meta)
 
 
+def dokku_git_sync_fetch(remote, data):
+    """Fetch `remote` once for every app tracking it.
+
+    Returns the source to sync the apps from and the refs of the remote. The
+    module user may lack the credentials dokku uses for the remote, so when
+    the remote cannot be read the apps are synced from it unconditionally.
+    """
+    if data["mirror"]:
+        path, error = dokku_git_mirror_update(
+            remote, data["mirror_dir"], data["mirror_max_size"] * 1024 * 1024
+        )
+        if error:
+            return (remote, None), None
+        refs, error = dokku_git_ls_remote_refs(path)
+        if error:
+            return (remote, None), None
+        return ("file://{0}".format(path), refs), None
+
+    refs, error = dokku_git_ls_remote_refs(remote)
+    return (remote, refs if error is None else None), None
+
+
+def dokku_git_sync_app(entry, fetched, data, config):
+    """Configure the git-sync remote of an app and sync it if needed.
+
+    Returns the changes made so far and the first error, if any.
+    """
+    changes = {"changed": [], "synced": False, "duration": None}
+    is_error, _has_changed, meta = dokku_module_present(
+        data={"app": entry["app"], "remote": entry["remote"]}, **config
+    )
+    changes["changed"] = meta.get("changed", [])
+    if is_error:
+        return changes, meta["error"]
+
+    source, refs = fetched
+    if refs is not None:
+        sha = dokku_git_resolve(refs, entry.get("ref"))
+        # a build is only skipped when the app is deployed at the ref
+        if data["build"]:
+            current = dokku_git_deployed_sha(entry["app"])
+        else:
+            current = dokku_git_sha(entry["app"])
+        if sha is not None and sha == current:
+            return changes, None
+
+    command = "dokku git:sync {0} {1}".format(entry["app"], pipes.quote(source))
+    if entry.get("ref"):
+        command += " {0}".format(pipes.quote(entry["ref"]))
+    if data["build"]:
+        command += " --build"
+
+    start = time.time()
+    try:
+        subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+    except subprocess.CalledProcessError as e:
+        return changes, subprocess_error(e)
+    finally:
+        changes["duration"] = round(time.time() - start, 3)
+
+    changes["synced"] = True
+    return changes, None
+
+
+def dokku_git_sync_bulk(data, config):
+    is_error = True
+    has_changed = False
+    meta = {
+        "present": False,
+        "changed": {},
+        "synced": [],
+        "skipped": [],
+        "timings": {},
+        "errors": {},
+    }
+
+    entries = data["apps"]
+    for entry in entries:
+        if not entry.get("app") or not entry.get("remote"):
+            meta["error"] = "Each app requires an app and a remote"
+            return (is_error, has_changed, meta)
+
+    # every remote is fetched once, however many apps track it
+    remotes = sorted(set(entry["remote"] for entry in entries))
+    fetched = dict(
+        zip(
+            remotes,
+            run_concurrently(
+                lambda remote: dokku_git_sync_fetch(remote, data),
+                remotes,
+                data["parallelism"],
+            ),
+        )
+    )
+
+    def sync(entry):
+        output, _error = fetched[entry["remote"]]
+        return dokku_git_sync_app(entry, output, data, config)
+
+    for entry, (changes, error) in zip(
+        entries,
+        run_per_app(
+            sync,
+            entries,
+            app_of=lambda entry: entry["app"],
+            parallelism=data["parallelism"],
+        ),
+    ):
+        app = entry["app"]
+        if changes and changes["changed"]:
+            meta["changed"][app] = changes["changed"]
+        if changes and changes["duration"] is not None:
+            meta["timings"][app] = changes["duration"]
+        if error is not None:
+            meta["errors"][app] = error
+        elif changes["synced"]:
+            meta["synced"].append(app)
+        else:
+            meta["skipped"].append(app)
+
+    has_changed = len(meta["changed"]) > 0 or len(meta["synced"]) > 0
+    if len(meta["errors"]) > 0:
+        meta["error"] = "Unable to sync: {0}".format(
+            ", ".join(sorted(meta["errors"].keys()))
+        )
+        return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = True
+    return (is_error, has_changed, meta)
+
+
 def main():
     fields = {
-        "app": {"required": True, "type": "str"},
+        "app": {"required": False, "type": "str"},
+        "apps": {"required": False, "default": [], "type": "list"},
         "remote": {"required": False, "type": "str", "default": None},
+        "build": {"required": False, "default": False, "type": "bool"},
+        "mirror": {"required": False, "default": False, "type": "bool"},
+        "mirror_dir": {
+            "required": False,
+            "default": "/var/lib/dokku/data/git-mirrors",
+            "type": "str",
+        },
+        "mirror_max_size": {"required": False, "default": 10240, "type": "int"},
+        "parallelism": {"required": False, "default": 4, "type": "int"},
         "state": {
             "required": False,
             "default": "present",
@@ -272,15 +481,28 @@ def main():
     setable_fields = ["remote"]
     RE_PREFIX = re.compile("^git-sync-")
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
-    is_error, has_changed, result = choice_map.get(module.params["state"])(
-        command_prefix=command_prefix,
-        data=module.params,
-        re_compiled=RE_PREFIX,
-        allowed_report_keys=allowed_report_keys,
-        required_present_fields=required_present_fields,
-        setable_fields=setable_fields,
+    config = {
+        "command_prefix": command_prefix,
+        "re_compiled": RE_PREFIX,
+        "allowed_report_keys": allowed_report_keys,
+        "required_present_fields": required_present_fields,
+        "setable_fields": setable_fields,
+    }
+
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["app", "apps"]],
+        mutually_exclusive=[["app", "apps"]],
+        supports_check_mode=False,
     )
+    if module.params["apps"]:
+        if module.params["state"] == "absent":
+            module.fail_json(msg='"apps" can only be used with the present state')
+        is_error, has_changed, result = dokku_git_sync_bulk(module.params, config)
+    else:
+        is_error, has_changed, result = choice_map.get(module.params["state"])(
+            data=module.params, **config
+        )
 
     if is_error:
         module.fail_json(msg=result["error"], meta=result)
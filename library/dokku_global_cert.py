@@ -1,8 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
-import re
+from ansible.module_utils.dokku_certs import dokku_global_cert_report
 import subprocess
 
 DOCUMENTATION = """
@@ -50,50 +49,12 @@ EXAMPLES = """
 """
 
 
-def to_bool(v):
-    return v.lower() == "true"
-
-
-def dokku_global_cert(data):
-    command = "dokku --quiet global-cert:report"
-    output, error = subprocess_check_output(command)
-    if error is not None:
-        return output, error
-    output = [re.sub(r"\s\s+", "", line) for line in output]
-    report = {}
-
-    allowed_keys = [
-        "dir",
-        "enabled",
-        "hostnames",
-        "expires at",
-        "issuer",
-        "starts at",
-        "subject",
-        "verified",
-    ]
-    RE_PREFIX = re.compile("^global-cert-")
-    for line in output:
-        if ":" not in line:
-            continue
-        key, value = line.split(":", 1)
-        key = RE_PREFIX.sub(r"", key.replace(" ", "-").lower())
-        if key not in allowed_keys:
-            continue
-
-        if key == "enabled":
-            value = to_bool(value)
-        report[key] = value
-
-    return report, error
-
-
 def dokku_global_cert_absent(data=None):
     has_changed = False
     is_error = True
     meta = {"present": True}
 
-    report, error = dokku_global_cert(data)
+    report, error = dokku_global_cert_report()
     if error:
         meta["error"] = error
         return (is_error, has_changed, meta)
@@ -120,7 +81,7 @@ def dokku_global_cert_present(data):
     has_changed = False
     meta = {"present": False}
 
-    report, error = dokku_global_cert(data)
+    report, error = dokku_global_cert_report()
     if error:
         meta["error"] = error
         return (is_error, has_changed, meta)
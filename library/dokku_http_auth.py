@@ -1,14 +1,39 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import base64
+import hashlib
+import hmac
+import os
+import pipes
 import subprocess
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_utils import dokku_report
+
+try:
+    import crypt
+
+    HAS_CRYPT = True
+except ImportError:
+    HAS_CRYPT = False
+
+try:
+    import bcrypt
+
+    HAS_BCRYPT = True
+except ImportError:
+    HAS_BCRYPT = False
 
 DOCUMENTATION = """
 ---
 module: dokku_http_auth
 short_description: Manage HTTP Basic Authentication for a dokku app
+description:
+  - >
+    Passwords are verified against the hashes in the htpasswd file of the app,
+    so users, passwords and allowed ips are only changed when they differ.
+    apr1, md5 and {SHA} hashes are always supported, other crypt schemes need
+    the python `crypt` module and bcrypt hashes the `bcrypt` module.
 options:
   app:
     description:
@@ -25,13 +50,35 @@ options:
     aliases: []
   username:
     description:
-      - The HTTP Auth Username (required for 'present' state)
+      - The HTTP Auth Username (required for 'present' state if `users` is not set)
     required: False
     aliases: []
   password:
     description:
-      - The HTTP Auth Password (required for 'present' state)
+      - The HTTP Auth Password (required for 'present' state if `users` is not set)
+    required: False
+    aliases: []
+  users:
+    description:
+      - >
+        A map of usernames to passwords. Together with `username`, these are the
+        only users allowed, any other user is removed.
+    required: False
+    default: {}
+    aliases: []
+  allowed_ips:
+    description:
+      - >
+        The ips or networks allowed to skip authentication. Any other allowed ip
+        is removed. Left untouched when not set.
+    required: False
+    default: null
+    aliases: []
+  dokku_root:
+    description:
+      - The dokku home directory
     required: False
+    default: /home/dokku
     aliases: []
 author: Simo Aleksandrov
 requirements:
@@ -46,50 +93,191 @@ EXAMPLES = """
     username: samsepi0l
     password: hunter2
 
+- name: Enable the http-auth plugin for several users and an office network
+  dokku_http_auth:
+    app: hello-world
+    users:
+      samsepi0l: hunter2
+      mr-robot: fsociety
+    allowed_ips:
+      - 10.0.0.0/8
+
 - name: Disable the http-auth plugin
   dokku_http_auth:
     app: hello-world
     state: absent
 """
 
+ITOA64 = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def dokku_http_auth_md5_crypt(password, salt, magic):
+    """Hash `password` with the md5 based crypt used by `$1$` and `$apr1$`."""
+    password = password.encode("utf-8")
+    salt = salt.encode("utf-8")[:8]
+    magic = magic.encode("utf-8")
+
+    ctx = password + magic + salt
+    final = hashlib.md5(password + salt + password).digest()
+    for length in range(len(password), 0, -16):
+        ctx += final[: min(16, length)]
+    i = len(password)
+    while i:
+        ctx += b"\x00" if i & 1 else password[:1]
+        i >>= 1
+    final = hashlib.md5(ctx).digest()
+
+    for i in range(1000):
+        ctx = password if i & 1 else final
+        if i % 3:
+            ctx += salt
+        if i % 7:
+            ctx += password
+        ctx += final if i & 1 else password
+        final = hashlib.md5(ctx).digest()
+
+    encoded = ""
+    for a, b, c in [(0, 6, 12), (1, 7, 13), (2, 8, 14), (3, 9, 15), (4, 10, 5)]:
+        value = (final[a] << 16) | (final[b] << 8) | final[c]
+        for _ in range(4):
+            encoded += ITOA64[value & 0x3F]
+            value >>= 6
+    value = final[11]
+    for _ in range(2):
+        encoded += ITOA64[value & 0x3F]
+        value >>= 6
+
+    return "{0}{1}${2}".format(magic.decode("utf-8"), salt.decode("utf-8"), encoded)
+
+
+def dokku_http_auth_verify(password, hashed):
+    """Check `password` against an htpasswd hash.
+
+    Returns `None` when the hash scheme cannot be verified on this host.
+    """
+    if hashed.startswith("$apr1$") or hashed.startswith("$1$"):
+        magic = hashed[: hashed.index("$", 1) + 1]
+        salt = hashed.split("$")[2]
+        expected = dokku_http_auth_md5_crypt(password, salt, magic)
+    elif hashed.startswith("{SHA}"):
+        digest = hashlib.sha1(password.encode("utf-8")).digest()
+        expected = "{SHA}" + base64.b64encode(digest).decode("ascii")
+    elif hashed[:4] in ["$2a$", "$2b$", "$2y$"]:
+        if not HAS_BCRYPT:
+            return None
+        # the bcrypt module does not know the apache $2y$ prefix
+        checked = "$2b$" + hashed[4:]
+        return bcrypt.checkpw(password.encode("utf-8"), checked.encode("utf-8"))
+    elif HAS_CRYPT:
+        expected = crypt.crypt(password, hashed)
+        if expected is None:
+            return None
+    else:
+        return None
 
-def dokku_http_auth_enabled(data):
-    command = "dokku --quiet http-auth:report {0}"
-    response, error = subprocess_check_output(command.format(data["app"]))
+    return hmac.compare_digest(expected, hashed)
 
+
+def dokku_http_auth_htpasswd(data):
+    """Get the users of the htpasswd file of the app as a map of user => hash."""
+    path = os.path.join(data["dokku_root"], data["app"], "htpasswd")
+    users = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if ":" not in line:
+                    continue
+                username, hashed = line.split(":", 1)
+                users[username] = hashed
+    except (IOError, OSError):
+        pass
+    return users
+
+
+def dokku_http_auth_run(command):
+    try:
+        subprocess.check_call(command, shell=True)
+    except subprocess.CalledProcessError as e:
+        return str(e)
+    return None
+
+
+def dokku_http_auth_report(data):
+    report, error = dokku_report("http-auth", data["app"])
     if error:
         return None, error
-
-    report = response[0].split(":")[1]
-    return report.strip() == "true", error
+    return report.get(data["app"], {}), error
 
 
 def dokku_http_auth_present(data):
     is_error = True
     has_changed = False
-    meta = {"present": False}
+    meta = {"present": False, "changed": []}
 
-    enabled, error = dokku_http_auth_enabled(data)
+    users = dict(data["users"] or {})
+    if data["username"]:
+        users[data["username"]] = data["password"]
+    if len(users) == 0 or any(password is None for password in users.values()):
+        meta["error"] = "A password is required for every http-auth user"
+        return (is_error, has_changed, meta)
+
+    report, error = dokku_http_auth_report(data)
     if error:
         meta["error"] = error
         return (is_error, has_changed, meta)
+    enabled = report.get("enabled") == "true"
 
-    if enabled:
-        is_error = False
-        meta["present"] = True
-        return (is_error, has_changed, meta)
+    app = pipes.quote(data["app"])
+    existing = dokku_http_auth_htpasswd(data)
+    commands = []
+    for username in sorted(set(existing) - set(users)):
+        command = "dokku --quiet http-auth:remove-user {0} {1}"
+        commands.append(command.format(app, pipes.quote(username)))
 
-    command = "dokku --quiet http-auth:on {0} {1} {2}".format(
-        data["app"], data["username"], data["password"]
-    )
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
+    additions = []
+    for username, password in sorted(users.items()):
+        if username in existing:
+            if dokku_http_auth_verify(str(password), existing[username]):
+                continue
+            command = "dokku --quiet http-auth:remove-user {0} {1}"
+            commands.append(command.format(app, pipes.quote(username)))
+        additions.append((pipes.quote(username), pipes.quote(str(password))))
+
+    # http-auth:on takes the first missing user, so it is not written twice
+    enable = None
+    if not enabled:
+        enable = "dokku --quiet http-auth:on {0}".format(app)
+        if additions:
+            enable += " {0} {1}".format(*additions.pop(0))
+    for username, password in additions:
+        command = "dokku --quiet http-auth:add-user {0} {1} {2}"
+        commands.append(command.format(app, username, password))
+
+    if data["allowed_ips"] is not None:
+        current = set(report.get("allowed-ips", "").split())
+        wanted = set(str(ip) for ip in data["allowed_ips"])
+        for ip in sorted(current - wanted):
+            command = "dokku --quiet http-auth:remove-allowed-ip {0} {1}"
+            commands.append(command.format(app, pipes.quote(ip)))
+        for ip in sorted(wanted - current):
+            command = "dokku --quiet http-auth:add-allowed-ip {0} {1}"
+            commands.append(command.format(app, pipes.quote(ip)))
+
+    if enable:
+        commands.append(enable)
+
+    for command in commands:
+        error = dokku_http_auth_run(command)
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
         has_changed = True
-        meta["present"] = True
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
+        # only the subcommand is reported, as it can contain a password
+        meta["changed"].append(command.split()[2])
 
+    is_error = False
+    meta["present"] = True
     return (is_error, has_changed, meta)
 
 
@@ -98,12 +286,12 @@ def dokku_http_auth_absent(data=None):
     has_changed = False
     meta = {"present": True}
 
-    enabled, error = dokku_http_auth_enabled(data)
+    report, error = dokku_http_auth_report(data)
     if error:
         meta["error"] = error
         return (is_error, has_changed, meta)
 
-    if enabled is False:
+    if report.get("enabled") != "true":
         is_error = False
         meta["present"] = False
         return (is_error, has_changed, meta)
@@ -131,13 +319,20 @@ def main():
         },
         "username": {"required": False, "type": "str"},
         "password": {"required": False, "type": "str", "no_log": True},
+        "users": {"required": False, "default": {}, "type": "dict", "no_log": True},
+        "allowed_ips": {"required": False, "type": "list"},
+        "dokku_root": {"required": False, "default": "/home/dokku", "type": "str"},
     }
     choice_map = {
         "present": dokku_http_auth_present,
         "absent": dokku_http_auth_absent,
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_together=[["username", "password"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = choice_map.get(module.params["state"])(
         module.params
     )
@@ -1,5 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import json
+import os
 import subprocess
 
 from ansible.module_utils.basic import AnsibleModule
@@ -10,6 +12,10 @@ DOCUMENTATION = """
 ---
 module: dokku_image
 short_description: Pull Docker image and deploy app
+description:
+  - The image is resolved to its manifest digest, locally or through the registry
+    manifest. If it matches the digest recorded for the current deploy,
+    `git:from-image` is skipped.
 options:
   app:
     description:
@@ -41,6 +47,12 @@ options:
     required: False
     default: null
     aliases: []
+  state_file:
+    description:
+      - File used to record the digest of the image deployed for each app
+    required: False
+    default: /var/lib/dokku/data/ansible/images.json
+    aliases: []
 author: Simo Aleksandrov
 """
 
@@ -63,6 +75,89 @@ EXAMPLES = """
 """
 
 
+def docker_image_digest(image):
+    """Resolve an image reference to its manifest digest.
+
+    Returns `None` when the digest cannot be determined.
+    """
+    if "@sha256:" in image:
+        return image.split("@", 1)[1]
+
+    # a local image is what git:from-image would build from, its repo digest
+    # is the digest of the manifest it was pulled with
+    command = ["docker", "image", "inspect", "--format", "{{json .RepoDigests}}"]
+    command.append(image)
+    try:
+        output = subprocess.check_output(command, stderr=subprocess.DEVNULL)
+        repo_digests = json.loads(output.decode("utf-8")) or []
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        repo_digests = None
+    if repo_digests is not None:
+        # images built locally have no manifest digest to compare
+        repository = docker_image_repository(image)
+        matching = [d for d in repo_digests if d.split("@", 1)[0] == repository]
+        repo_digests = matching or repo_digests
+        return repo_digests[0].split("@", 1)[1] if repo_digests else None
+
+    command = ["docker", "manifest", "inspect", "--verbose", image]
+    try:
+        output = subprocess.check_output(command, stderr=subprocess.DEVNULL)
+        manifest = json.loads(output.decode("utf-8"))
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+    # manifest lists only expose per-platform digests
+    if isinstance(manifest, dict):
+        return manifest.get("Descriptor", {}).get("digest")
+    return None
+
+
+def docker_image_repository(image):
+    """Strip the tag and digest of an image reference."""
+    name = image.split("@", 1)[0]
+    if ":" in name.rsplit("/", 1)[-1]:
+        name = name.rsplit(":", 1)[0]
+    return name
+
+
+def dokku_image_state_load(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def dokku_image_record(data):
+    return dokku_image_state_load(data["state_file"]).get(data["app"])
+
+
+def dokku_image_record_entry(data, digest, sha):
+    return {
+        "image": data["image"],
+        "build_dir": data["build_dir"],
+        "digest": digest,
+        "sha": sha,
+    }
+
+
+def dokku_image_record_save(data, digest, sha):
+    state = dokku_image_state_load(data["state_file"])
+    state[data["app"]] = dokku_image_record_entry(data, digest, sha)
+    try:
+        directory = os.path.dirname(data["state_file"])
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp_file = "{0}.tmp".format(data["state_file"])
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.rename(tmp_file, data["state_file"])
+    except (IOError, OSError):
+        pass
+
+
 def dokku_image(data):
     # create app (if not exists)
     is_error, has_changed, meta = dokku_app_ensure_present(data)
@@ -72,6 +167,16 @@ def dokku_image(data):
 
     sha_old = dokku_git_sha(data["app"])
 
+    digest = docker_image_digest(data["image"])
+    record = dokku_image_record(data)
+    if (
+        digest is not None
+        and sha_old
+        and record == dokku_image_record_entry(data, digest, sha_old)
+    ):
+        meta["present"] = True
+        return (is_error, has_changed, meta)
+
     # get image
     command_git_from_image = "dokku git:from-image {app} {image}".format(
         app=data["app"], image=data["image"]
@@ -97,14 +202,19 @@ def dokku_image(data):
         elif "No changes detected, skipping git commit" in str(e.output):
             is_error = False
             has_changed = False
+            if digest is not None:
+                dokku_image_record_save(data, digest, sha_old)
         else:
             meta["error"] = str(e.output)
         return (is_error, has_changed, meta)
     finally:
         meta["present"] = True  # meaning: requested *version* of app is present
 
-    if dokku_git_sha(data["app"]) != sha_old:
+    sha_new = dokku_git_sha(data["app"])
+    if sha_new != sha_old:
         has_changed = True
+    if digest is not None:
+        dokku_image_record_save(data, digest, sha_new)
 
     return (is_error, has_changed, meta)
 
@@ -116,6 +226,11 @@ def main():
         "user_name": {"required": False, "type": "str"},
         "user_email": {"required": False, "type": "str"},
         "build_dir": {"required": False, "type": "str"},
+        "state_file": {
+            "required": False,
+            "default": "/var/lib/dokku/data/ansible/images.json",
+            "type": "str",
+        },
     }
 
     module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
@@ -1,8 +1,17 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_utils import (
+    run_per_app,
+    run_retrying,
+    subprocess_check_output,
+    subprocess_error,
+)
+import json
+import os
 import subprocess
+import threading
+import time
 
 DOCUMENTATION = """
 ---
@@ -11,10 +20,50 @@ short_description: Enable or disable the letsencrypt plugin for a dokku app
 options:
   app:
     description:
-      - The name of the app
-    required: True
+      - The name of the app (required unless `apps` is set)
+    required: False
     default: null
     aliases: []
+  apps:
+    description:
+      - A list of apps to manage in a single task. Certificates are requested
+        within the letsencrypt rate limits, in parallel for apps that do not
+        share a registered domain. Apps that would exceed the limits are
+        returned in `meta.deferred` with a warning, and requested on a later run.
+    required: False
+    default: []
+    aliases: []
+  parallelism:
+    description:
+      - Maximum number of certificates requested at the same time in bulk mode
+    required: False
+    default: 4
+    aliases: []
+  certs_per_domain:
+    description:
+      - Maximum number of certificates requested per registered domain and week
+    required: False
+    default: 50
+    aliases: []
+  orders_per_window:
+    description:
+      - Maximum number of certificate orders within `orders_window` seconds
+    required: False
+    default: 300
+    aliases: []
+  orders_window:
+    description:
+      - Length of the window used for `orders_per_window`, in seconds
+    required: False
+    default: 10800
+    aliases: []
+  state_file:
+    description:
+      - File used to record requested certificates across runs, so that rate
+        limits are respected when a failed batch is resumed
+    required: False
+    default: /var/lib/dokku/data/ansible/letsencrypt.json
+    aliases: []
   state:
     description:
       - The state of the letsencrypt plugin
@@ -36,17 +85,198 @@ EXAMPLES = """
   dokku_letsencrypt:
     app: hello-world
     state: absent
+
+- name: Enable the letsencrypt plugin for many apps
+  dokku_letsencrypt:
+    apps:
+      - hello-world
+      - other-app
+    parallelism: 2
 """
 
+CERTS_PER_DOMAIN_WINDOW = 7 * 24 * 60 * 60
+
+
+def dokku_letsencrypt_list():
+    command = "dokku --quiet letsencrypt:list"
+    output, error = subprocess_check_output(command)
+    if error:
+        return None, error
+
+    apps = set()
+    for line in output:
+        if line.startswith("----->") or line.startswith("=====>"):
+            continue
+        apps.add(line.split()[0])
+    return apps, error
+
 
 def dokku_letsencrypt_enabled(data):
-    command = "dokku --quiet letsencrypt:list | awk '{{print $1}}'"
-    response, error = subprocess_check_output(command.format(data["app"]))
+    apps, error = dokku_letsencrypt_list()
+    if error:
+        return None, error
+
+    return data["app"] in apps, error
+
 
+def dokku_letsencrypt_enable(app):
+    command = "dokku --quiet letsencrypt:enable {0}".format(app)
+    try:
+        subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+    except subprocess.CalledProcessError as e:
+        return None, subprocess_error(e)
+    return True, None
+
+
+def dokku_letsencrypt_registered_domains(app):
+    command = "dokku --quiet domains:report {0} --domains-app-vhosts".format(app)
+    output, error = subprocess_check_output(command, split=" ")
     if error:
         return None, error
 
-    return data["app"] in response, error
+    # approximates the registered domain without the public suffix list
+    domains = set()
+    for domain in output:
+        labels = domain.strip().rstrip(".").split(".")
+        domains.add(".".join(labels[-2:]))
+    return sorted(domains), error
+
+
+def dokku_letsencrypt_state_load(state_file):
+    state = {"orders": [], "domains": {}}
+    if not os.path.exists(state_file):
+        return state
+    try:
+        with open(state_file) as f:
+            state.update(json.load(f))
+    except (IOError, OSError, ValueError):
+        pass
+    return state
+
+
+def dokku_letsencrypt_state_save(state_file, state):
+    directory = os.path.dirname(state_file)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp_file = "{0}.tmp".format(state_file)
+    with open(tmp_file, "w") as f:
+        json.dump(state, f)
+    os.rename(tmp_file, state_file)
+
+
+def dokku_letsencrypt_groups(domains_by_app):
+    """Group apps so that apps sharing a registered domain end up together."""
+    parent = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            x = parent[x]
+        return x
+
+    for app, domains in domains_by_app.items():
+        for domain in domains:
+            parent[find(domain)] = find(app)
+        find(app)
+
+    groups = {}
+    for app in domains_by_app:
+        groups.setdefault(find(app), []).append(app)
+    return list(groups.values())
+
+
+def dokku_letsencrypt_bulk(data):
+    is_error = True
+    has_changed = False
+    meta = {"enabled": [], "deferred": [], "failed": {}}
+
+    enabled, error = dokku_letsencrypt_list()
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    pending = [app for app in data["apps"] if app not in enabled]
+    meta["skipped"] = [app for app in data["apps"] if app in enabled]
+    if len(pending) == 0:
+        is_error = False
+        return (is_error, has_changed, meta)
+
+    domains_by_app = {}
+    for app in pending:
+        domains, error = dokku_letsencrypt_registered_domains(app)
+        if error:
+            meta["failed"][app] = error
+            continue
+        domains_by_app[app] = domains
+
+    now = time.time()
+    state = dokku_letsencrypt_state_load(data["state_file"])
+    state["orders"] = [t for t in state["orders"] if now - t < data["orders_window"]]
+    for domain, issued in list(state["domains"].items()):
+        state["domains"][domain] = [
+            t for t in issued if now - t < CERTS_PER_DOMAIN_WINDOW
+        ]
+    lock = threading.Lock()
+
+    def reserve(app):
+        domains = domains_by_app[app]
+        if len(state["orders"]) >= data["orders_per_window"]:
+            return False
+        for domain in domains:
+            if len(state["domains"].get(domain, [])) >= data["certs_per_domain"]:
+                return False
+        timestamp = time.time()
+        state["orders"].append(timestamp)
+        for domain in domains:
+            state["domains"].setdefault(domain, []).append(timestamp)
+        dokku_letsencrypt_state_save(data["state_file"], state)
+        return timestamp
+
+    def release(app, timestamp):
+        # failed orders still count, but no certificate was issued
+        for domain in domains_by_app[app]:
+            if timestamp in state["domains"].get(domain, []):
+                state["domains"][domain].remove(timestamp)
+        dokku_letsencrypt_state_save(data["state_file"], state)
+
+    def enable(app):
+        with lock:
+            timestamp = reserve(app)
+        if not timestamp:
+            return "deferred", None
+        # only the command is retried, the order is reserved once
+        _, error = run_retrying(lambda: dokku_letsencrypt_enable(app), app)
+        if error:
+            with lock:
+                release(app, timestamp)
+            return "failed", error
+        return "enabled", None
+
+    # apps sharing a registered domain are enabled one after the other
+    groups = dokku_letsencrypt_groups(domains_by_app)
+    group_of = dict((app, i) for i, apps in enumerate(groups) for app in apps)
+    apps = [app for apps in groups for app in apps]
+    results = run_per_app(
+        enable,
+        apps,
+        serialize_by=group_of.get,
+        parallelism=data["parallelism"],
+        retries=0,
+    )
+    for app, (status, error) in zip(apps, results):
+        if status == "failed":
+            meta["failed"][app] = error
+        else:
+            meta[status].append(app)
+
+    has_changed = len(meta["enabled"]) > 0
+    if len(meta["failed"]) > 0:
+        meta["error"] = "Unable to enable letsencrypt for: {0}".format(
+            ", ".join(sorted(meta["failed"].keys()))
+        )
+        return (is_error, has_changed, meta)
+
+    is_error = False
+    return (is_error, has_changed, meta)
 
 
 def dokku_letsencrypt_present(data):
@@ -54,21 +284,23 @@ def dokku_letsencrypt_present(data):
     has_changed = False
     meta = {"present": False}
 
+    if data["apps"]:
+        return dokku_letsencrypt_bulk(data)
+
     enabled, error = dokku_letsencrypt_enabled(data)
     if enabled:
         is_error = False
         meta["present"] = True
         return (is_error, has_changed, meta)
 
-    command = "dokku --quiet letsencrypt:enable {0}".format(data["app"])
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
-        has_changed = True
-        meta["present"] = True
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
+    _, error = dokku_letsencrypt_enable(data["app"])
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
 
+    is_error = False
+    has_changed = True
+    meta["present"] = True
     return (is_error, has_changed, meta)
 
 
@@ -77,6 +309,10 @@ def dokku_letsencrypt_absent(data=None):
     has_changed = False
     meta = {"present": True}
 
+    if data["apps"]:
+        meta["error"] = '"apps" can only be used with the "present" state.'
+        return (is_error, has_changed, meta)
+
     enabled, error = dokku_letsencrypt_enabled(data)
     if enabled is False:
         is_error = False
@@ -97,7 +333,17 @@ def dokku_letsencrypt_absent(data=None):
 
 def main():
     fields = {
-        "app": {"required": True, "type": "str"},
+        "app": {"required": False, "type": "str"},
+        "apps": {"required": False, "default": [], "type": "list"},
+        "parallelism": {"required": False, "default": 4, "type": "int"},
+        "certs_per_domain": {"required": False, "default": 50, "type": "int"},
+        "orders_per_window": {"required": False, "default": 300, "type": "int"},
+        "orders_window": {"required": False, "default": 10800, "type": "int"},
+        "state_file": {
+            "required": False,
+            "default": "/var/lib/dokku/data/ansible/letsencrypt.json",
+            "type": "str",
+        },
         "state": {
             "required": False,
             "default": "present",
@@ -110,11 +356,22 @@ def main():
         "absent": dokku_letsencrypt_absent,
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["app", "apps"]],
+        mutually_exclusive=[["app", "apps"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = choice_map.get(module.params["state"])(
         module.params
     )
 
+    if result.get("deferred"):
+        module.warn(
+            "Letsencrypt rate limits reached, deferred apps: {0}".format(
+                ", ".join(result["deferred"])
+            )
+        )
     if is_error:
         module.fail_json(msg=result["error"], meta=result)
     module.exit_json(changed=has_changed, meta=result)
@@ -1,6 +1,12 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_utils import (
+    dokku_report_forget,
+    dokku_report_value,
+    subprocess_check_output,
+)
+import re
 import subprocess
 
 DOCUMENTATION = """
@@ -10,10 +16,38 @@ short_description: Create or destroy container networks for dokku apps
 options:
   name:
     description:
-      - The name of the network
-    required: True
+      - The name of the network (required unless `names` is set)
+    required: False
     default: null
     aliases: []
+  names:
+    description:
+      - A list of networks to manage in a single task. Existing networks are
+        read once with `network:list`.
+    required: False
+    default: []
+    aliases: []
+  apps:
+    description:
+      - Apps to attach the networks to through the network property `property`.
+        Only used with the `present` state. The networks are added to those
+        already attached unless `exclusive` is set.
+    required: False
+    default: []
+    aliases: []
+  exclusive:
+    description:
+      - Whether to detach the networks of `apps` that are not in `names`
+    required: False
+    default: False
+    aliases: []
+  property:
+    description:
+      - The network property used to attach the networks to `apps`
+    required: False
+    default: attach-post-deploy
+    choices: [ "attach-post-create", "attach-post-deploy", "initial-network" ]
+    aliases: []
   state:
     description:
       - The state of the network
@@ -34,6 +68,23 @@ EXAMPLES = """
   dokku_network:
     name: example-network
     state: absent
+
+- name: Create tenant networks and attach them to an app
+  dokku_network:
+    names:
+      - tenant-a
+      - tenant-b
+    apps:
+      - hello-world
+    property: attach-post-deploy
+
+- name: Attach an app to the tenant-a network only
+  dokku_network:
+    names:
+      - tenant-a
+    apps:
+      - hello-world
+    exclusive: true
 """
 
 
@@ -49,11 +100,90 @@ def dokku_network_exists(network):
     return exists, error
 
 
+def dokku_network_list():
+    command = "dokku --quiet network:list"
+    output, error = subprocess_check_output(command)
+    if error is not None:
+        return None, error
+
+    return set(line for line in output if not line.startswith("=====>")), error
+
+
+def dokku_network_attach(data, meta):
+    if data["property"] == "initial-network" and len(data["names"]) > 1:
+        return 'Only one network can be used with "initial-network".'
+
+    for app in data["apps"]:
+        value = dokku_report_value("network", data["property"], app) or ""
+        current = [n for n in re.split(r"[,\s]+", value) if n]
+        # network:set replaces the property, so other networks are kept in it
+        networks = list(data["names"])
+        if not data["exclusive"] and data["property"] != "initial-network":
+            networks = current + [n for n in data["names"] if n not in current]
+        if sorted(current) == sorted(networks):
+            continue
+
+        command = "dokku --quiet network:set {0} {1} {2}".format(
+            app, data["property"], " ".join(networks)
+        )
+        try:
+            subprocess.check_call(command, shell=True)
+            meta["attached"].append(app)
+        except subprocess.CalledProcessError as e:
+            return str(e)
+        finally:
+            dokku_report_forget("network", app)
+
+    return None
+
+
+def dokku_network_bulk(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": data["state"] == "absent", "changed": [], "attached": []}
+
+    existing, error = dokku_network_list()
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    if data["state"] == "present":
+        command = "dokku network:create {0}"
+        networks = [n for n in data["names"] if n not in existing]
+    else:
+        command = "dokku --force network:destroy {0}"
+        networks = [n for n in data["names"] if n in existing]
+
+    for network in networks:
+        try:
+            subprocess.check_call(command.format(network), shell=True)
+            meta["changed"].append(network)
+        except subprocess.CalledProcessError as e:
+            meta["error"] = str(e)
+            has_changed = len(meta["changed"]) > 0
+            return (is_error, has_changed, meta)
+
+    if data["state"] == "present":
+        error = dokku_network_attach(data, meta)
+        if error:
+            meta["error"] = error
+            has_changed = len(meta["changed"] + meta["attached"]) > 0
+            return (is_error, has_changed, meta)
+
+    is_error = False
+    has_changed = len(meta["changed"] + meta["attached"]) > 0
+    meta["present"] = data["state"] == "present"
+    return (is_error, has_changed, meta)
+
+
 def dokku_network_present(data):
     is_error = True
     has_changed = False
     meta = {"present": False}
 
+    if data["names"]:
+        return dokku_network_bulk(data)
+
     exists, error = dokku_network_exists(data["name"])
     if exists:
         is_error = False
@@ -77,6 +207,9 @@ def dokku_network_absent(data=None):
     has_changed = False
     meta = {"present": True}
 
+    if data["names"]:
+        return dokku_network_bulk(data)
+
     exists, error = dokku_network_exists(data["name"])
     if not exists:
         is_error = False
@@ -97,7 +230,16 @@ def dokku_network_absent(data=None):
 
 def main():
     fields = {
-        "name": {"required": True, "type": "str"},
+        "name": {"required": False, "type": "str"},
+        "names": {"required": False, "default": [], "type": "list"},
+        "apps": {"required": False, "default": [], "type": "list"},
+        "exclusive": {"required": False, "default": False, "type": "bool"},
+        "property": {
+            "required": False,
+            "default": "attach-post-deploy",
+            "choices": ["attach-post-create", "attach-post-deploy", "initial-network"],
+            "type": "str",
+        },
         "state": {
             "required": False,
             "default": "present",
@@ -110,7 +252,12 @@ def main():
         "absent": dokku_network_absent,
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["name", "names"]],
+        mutually_exclusive=[["name", "names"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = choice_map.get(module.params["state"])(
         module.params
     )
@@ -1,6 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_utils import dokku_report_value, dokku_value_str
 import subprocess
 
 DOCUMENTATION = """
@@ -25,7 +26,7 @@ options:
         The network property to be be modified. This can be any property supported
         by dokku (e.g., `initial-network`, `attach-post-create`, `attach-post-deploy`,
         `bind-all-interfaces`, `static-web-listener`, `tld`).
-    required: True
+    required: False
     default: null
     aliases: []
   value:
@@ -34,6 +35,12 @@ options:
     required: False
     default: null
     aliases: []
+  properties:
+    description:
+      - A map of network properties to values, to set several properties in one task
+    required: False
+    default: {}
+    aliases: []
 author: Philipp Sessler
 requirements: [ ]
 """
@@ -61,38 +68,53 @@ EXAMPLES = """
   dokku_network_property:
     app: hello-world
     property: attach-post-create
+
+- name: Setting several network properties
+  dokku_network_property:
+    app: hello-world
+    properties:
+      attach-post-create: example-network
+      bind-all-interfaces: "true"
 """
 
 
 def dokku_network_property_set(data):
     is_error = True
     has_changed = False
-    meta = {"present": False}
+    meta = {"present": False, "changed": []}
 
     if data["global"] and data["app"]:
         is_error = True
         meta["error"] = 'When "global" is set to true, "app" must not be provided.'
         return (is_error, has_changed, meta)
 
-    # Check if "value" is set and evaluates to a non-empty string, otherwise use an empty string
-    value = data["value"] if "value" in data else None
-    if not value:
-        value = ""
-
-    command = "dokku network:set {0} {1} {2}".format(
-        "--global" if data["global"] else data["app"],
-        data["property"],
-        value,
-    )
-
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
-        has_changed = True
-        meta["present"] = True
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
-
+    properties = dict(data["properties"] or {})
+    if data["property"]:
+        properties[data["property"]] = data["value"]
+
+    # global values are read from the report without an app
+    app = None if data["global"] else data["app"]
+    for prop, value in sorted(properties.items()):
+        # Use an empty string to unset the property
+        value = dokku_value_str(value)
+        if dokku_report_value("network", prop, app) == value:
+            continue
+
+        command = "dokku network:set {0} {1} {2}".format(
+            "--global" if data["global"] else data["app"],
+            prop,
+            value,
+        )
+        try:
+            subprocess.check_call(command, shell=True)
+            has_changed = True
+            meta["changed"].append(prop)
+        except subprocess.CalledProcessError as e:
+            meta["error"] = str(e)
+            return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = True
     return (is_error, has_changed, meta)
 
 
@@ -100,11 +122,16 @@ def main():
     fields = {
         "global": {"required": False, "default": False, "type": "bool"},
         "app": {"required": False, "type": "str"},
-        "property": {"required": True, "type": "str"},
-        "value": {"required": False, "type": "str"},
+        "property": {"required": False, "type": "str"},
+        "value": {"required": False, "type": "raw"},
+        "properties": {"required": False, "default": {}, "type": "dict"},
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["property", "properties"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = dokku_network_property_set(module.params)
 
     if is_error:
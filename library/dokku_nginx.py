@@ -0,0 +1,221 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_utils import (
+    dokku_report,
+    dokku_value_str,
+    run_per_app,
+    subprocess_error,
+)
+import pipes
+import subprocess
+
+DOCUMENTATION = """
+---
+module: dokku_nginx
+short_description: Manage the nginx properties of dokku apps
+description:
+  - Reads `nginx:report` once and only sets the properties that differ, then
+    rebuilds the proxy config once for every changed app.
+options:
+  app:
+    description:
+      - The name of the app
+    required: False
+    default: null
+    aliases: []
+  global:
+    description:
+      - Whether to change the global nginx properties
+    required: False
+    default: False
+    aliases: []
+  properties:
+    description:
+      - >
+        A map of nginx properties to values (e.g. `client-max-body-size`,
+        `proxy-read-timeout`, `proxy-buffer-size`, `proxy-buffers`,
+        `keepalive-timeout`, `hsts`, `access-log-path`). Use an empty value to
+        unset a property.
+    required: False
+    default: {}
+    aliases: []
+  apps:
+    description:
+      - A map of apps to maps of properties, to manage several apps in one task
+    required: False
+    default: {}
+    aliases: []
+  parallelism:
+    description:
+      - Maximum number of apps updated at the same time when using `apps`
+    required: False
+    default: 4
+    aliases: []
+author: Jose Diaz-Gonzalez
+requirements: [ ]
+"""
+
+EXAMPLES = """
+- name: Allow larger uploads and slower responses
+  dokku_nginx:
+    app: hello-world
+    properties:
+      client-max-body-size: 50m
+      proxy-read-timeout: 120s
+
+- name: Disable the access logs and tune the buffers of busy apps
+  dokku_nginx:
+    apps:
+      api:
+        access-log-path: "off"
+        proxy-buffer-size: 16k
+        proxy-buffers: 8 16k
+      hello-world:
+        access-log-path: "off"
+
+- name: Enable HSTS for every app
+  dokku_nginx:
+    global: true
+    properties:
+      hsts: "true"
+      hsts-max-age: "31536000"
+"""
+
+
+def dokku_nginx_changes(properties, current):
+    """Get the properties whose value differs from `current`."""
+    changes = {}
+    for prop, value in properties.items():
+        # Use an empty string to unset the property
+        value = dokku_value_str(value)
+        if current.get(prop) != value:
+            changes[prop] = value
+    return changes
+
+
+def dokku_nginx_apply(target, changes):
+    """Set the changed properties of `target` and rebuild its proxy config.
+
+    Returns the list of properties changed so far and the first error, if any.
+    """
+    changed = []
+    for prop, value in sorted(changes.items()):
+        command = "dokku --quiet nginx:set {0} {1} {2}".format(
+            target, prop, pipes.quote(value) if value else ""
+        )
+        try:
+            subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+            changed.append(prop)
+        except subprocess.CalledProcessError as e:
+            return changed, subprocess_error(e)
+
+    if changed:
+        command = "dokku --quiet proxy:build-config {0}".format(
+            "--all" if target == "--global" else target
+        )
+        try:
+            subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+        except subprocess.CalledProcessError as e:
+            return changed, subprocess_error(e)
+
+    return changed, None
+
+
+def dokku_nginx_global_current(report):
+    """Get the global properties from the report of any app."""
+    if len(report) == 0:
+        return {}
+    values = list(report.values())[0]
+    return {
+        key.replace("global-", "", 1): value
+        for key, value in values.items()
+        if key.startswith("global-")
+    }
+
+
+def dokku_nginx_set(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False, "changed": {}}
+
+    if data["global"] and (data["app"] or data["apps"]):
+        meta["error"] = (
+            'When "global" is set to true, "app" and "apps" must not be provided.'
+        )
+        return (is_error, has_changed, meta)
+
+    if data["apps"]:
+        report, error = dokku_report("nginx")
+        targets = data["apps"]
+    elif data["global"]:
+        report, error = dokku_report("nginx")
+        if error is None:
+            report = {"--global": dokku_nginx_global_current(report)}
+        targets = {"--global": data["properties"]}
+    elif data["app"]:
+        report, error = dokku_report("nginx", data["app"])
+        targets = {data["app"]: data["properties"]}
+    else:
+        meta["error"] = 'One of "app", "apps" or "global" is required.'
+        return (is_error, has_changed, meta)
+
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    pending = {}
+    for target, properties in targets.items():
+        changes = dokku_nginx_changes(properties or {}, report.get(target, {}))
+        if changes:
+            pending[target] = changes
+
+    names = sorted(pending.keys())
+    errors = {}
+    results = run_per_app(
+        lambda target: dokku_nginx_apply(target, pending[target]),
+        names,
+        parallelism=data["parallelism"],
+    )
+    for target, (changed, error) in zip(names, results):
+        if changed:
+            meta["changed"][target] = changed
+        if error is not None:
+            errors[target] = error
+
+    has_changed = len(meta["changed"]) > 0
+    if errors:
+        meta["errors"] = errors
+        meta["error"] = "Unable to update the nginx properties of: {0}".format(
+            ", ".join(sorted(errors.keys()))
+        )
+        return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = True
+    return (is_error, has_changed, meta)
+
+
+def main():
+    fields = {
+        "app": {"required": False, "type": "str"},
+        "global": {"required": False, "default": False, "type": "bool"},
+        "properties": {"required": False, "default": {}, "type": "dict"},
+        "apps": {"required": False, "default": {}, "type": "dict"},
+        "parallelism": {"required": False, "default": 4, "type": "int"},
+    }
+
+    module = AnsibleModule(
+        argument_spec=fields,
+        mutually_exclusive=[["app", "apps"]],
+        supports_check_mode=False,
+    )
+    is_error, has_changed, result = dokku_nginx_set(module.params)
+
+    if is_error:
+        module.fail_json(msg=result["error"], meta=result)
+    module.exit_json(changed=has_changed, meta=result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from ansible.module_utils.basic import AnsibleModule
+import os
+import subprocess
+import time
+
+DOCUMENTATION = """
+---
+module: dokku_nginx_reload
+short_description: Defer the nginx reloads triggered by dokku and flush them at once
+description:
+  - >
+    Requires the reload wrapper installed by the role when
+    `dokku_nginx_coalesce_reload` is set. While reloads are deferred, every
+    reload requested by dokku still validates the nginx config but is only
+    recorded. Flushing ends the deferral and reloads nginx once if any reload
+    was recorded.
+  - >
+    Only config-only reloads are deferred. A reload is done right away when the
+    upstream servers of an app or its letsencrypt challenge config changed, as
+    zero-downtime deploys retire the old containers after `wait-to-retire` and
+    `letsencrypt:enable` needs the challenge location to be live. Other changes,
+    e.g. a new domain, only take effect once flushed or once the deferral expires.
+options:
+  state:
+    description:
+      - Whether to start deferring reloads or to flush the deferred reloads
+    required: False
+    default: deferred
+    choices: [ "deferred", "flushed" ]
+    aliases: []
+  timeout:
+    description:
+      - >
+        Seconds after which a deferral expires on its own, so a failed converge
+        cannot disable nginx reloads for good
+    required: False
+    default: 600
+    aliases: []
+author: Jose Diaz-Gonzalez
+requirements: [ ]
+"""
+
+EXAMPLES = """
+- hosts: dokku
+  pre_tasks:
+    - name: Defer nginx reloads
+      dokku_nginx_reload:
+        state: deferred
+
+  roles:
+    - dokku_bot.ansible_dokku
+
+  post_tasks:
+    - name: Reload nginx once
+      dokku_nginx_reload:
+        state: flushed
+"""
+
+STATE_DIR = "/run/dokku-nginx-reload"
+
+
+def dokku_nginx_reload_deferred_until():
+    try:
+        with open(os.path.join(STATE_DIR, "deferred")) as f:
+            return int(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return 0
+
+
+def dokku_nginx_reload_defer(data):
+    is_error = True
+    has_changed = False
+    meta = {"deferred": False}
+
+    now = int(time.time())
+    has_changed = dokku_nginx_reload_deferred_until() <= now
+    path = os.path.join(STATE_DIR, "deferred")
+    try:
+        if not os.path.isdir(STATE_DIR):
+            os.makedirs(STATE_DIR)
+        with open("{0}.tmp".format(path), "w") as f:
+            f.write("{0}\n".format(now + data["timeout"]))
+        os.rename("{0}.tmp".format(path), path)
+    except (IOError, OSError) as e:
+        meta["error"] = str(e)
+        return (is_error, False, meta)
+
+    is_error = False
+    meta["deferred"] = True
+    return (is_error, has_changed, meta)
+
+
+def dokku_nginx_reload_flush(data):
+    is_error = True
+    has_changed = False
+    meta = {"deferred": True, "reloaded": False}
+
+    try:
+        os.remove(os.path.join(STATE_DIR, "deferred"))
+    except OSError:
+        pass
+    meta["deferred"] = False
+
+    if not os.path.exists(os.path.join(STATE_DIR, "pending")):
+        is_error = False
+        return (is_error, has_changed, meta)
+
+    # the wrapper validates the config, reloads and clears the pending flag
+    command = "systemctl reload nginx"
+    try:
+        subprocess.check_call(command, shell=True)
+        has_changed = True
+        meta["reloaded"] = True
+    except subprocess.CalledProcessError as e:
+        meta["error"] = str(e)
+        return (is_error, has_changed, meta)
+
+    is_error = False
+    return (is_error, has_changed, meta)
+
+
+def main():
+    fields = {
+        "state": {
+            "required": False,
+            "default": "deferred",
+            "choices": ["deferred", "flushed"],
+            "type": "str",
+        },
+        "timeout": {"required": False, "default": 600, "type": "int"},
+    }
+    choice_map = {
+        "deferred": dokku_nginx_reload_defer,
+        "flushed": dokku_nginx_reload_flush,
+    }
+
+    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    is_error, has_changed, result = choice_map.get(module.params["state"])(
+        module.params
+    )
+
+    if is_error:
+        module.fail_json(msg=result["error"], meta=result)
+    module.exit_json(changed=has_changed, meta=result)
+
+
+if __name__ == "__main__":
+    main()
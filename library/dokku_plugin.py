@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_utils import subprocess_check_output
+import pipes
+import subprocess
+
+DOCUMENTATION = """
+---
+module: dokku_plugin
+short_description: Install, update or uninstall dokku plugins
+description:
+  - Reads `plugin:list` once and only installs missing plugins, updates plugins
+    whose version differs from the requested one, or uninstalls present plugins.
+  - "`plugin:install-dependencies` only runs when a plugin was installed or updated."
+options:
+  plugins:
+    description:
+      - >
+        A list of plugins, each with a `name`, a `url` and an optional `version`.
+        The `version` is the release tag to install. It is compared with the
+        version reported by `plugin:list` (a leading `v` is ignored), so
+        branches or commits never match and are not supported.
+    required: True
+    default: []
+    aliases: []
+  state:
+    description:
+      - The state of the plugins
+    required: False
+    default: present
+    choices: [ "present", "absent" ]
+    aliases: []
+author: Jose Diaz-Gonzalez
+requirements: [ ]
+"""
+
+EXAMPLES = """
+- name: Install plugins
+  dokku_plugin:
+    plugins:
+      - name: postgres
+        url: https://github.com/dokku/dokku-postgres.git
+      - name: letsencrypt
+        url: https://github.com/dokku/dokku-letsencrypt.git
+        version: 0.20.0
+
+- name: Uninstall a plugin
+  dokku_plugin:
+    plugins:
+      - name: letsencrypt
+    state: absent
+"""
+
+
+def dokku_plugin_list():
+    """Get installed plugins as a map of name => version."""
+    command = "dokku plugin:list"
+    output, error = subprocess_check_output(command)
+    if error is not None:
+        return None, error
+
+    plugins = {}
+    for line in output:
+        parts = line.split()
+        # skip the plugn version header
+        if len(parts) < 3 or parts[2] not in ["enabled", "disabled"]:
+            continue
+        plugins[parts[0]] = parts[1]
+    return plugins, error
+
+
+def dokku_plugin_run(command):
+    try:
+        subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+    except subprocess.CalledProcessError as e:
+        return str(e.output)
+    return None
+
+
+def dokku_plugin_present(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False, "installed": [], "updated": []}
+
+    installed, error = dokku_plugin_list()
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    for plugin in data["plugins"]:
+        name, url = plugin.get("name"), plugin.get("url")
+        version = plugin.get("version")
+        if not name or not url:
+            meta["error"] = "Each plugin requires a name and a url"
+            return (is_error, has_changed, meta)
+
+        if name not in installed:
+            command = "dokku plugin:install {0} --name {1}".format(
+                pipes.quote(url), pipes.quote(name)
+            )
+            if version:
+                command += " --committish {0}".format(pipes.quote(version))
+            key = "installed"
+        elif version and str(version).lstrip("v") != installed[name].lstrip("v"):
+            command = "dokku plugin:update {0} {1}".format(
+                pipes.quote(name), pipes.quote(version)
+            )
+            key = "updated"
+        else:
+            continue
+
+        # plugins are installed one at a time as every install runs the
+        # install triggers of all plugins
+        error = dokku_plugin_run(command)
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        has_changed = True
+        meta[key].append(name)
+
+    if has_changed:
+        error = dokku_plugin_run("dokku plugin:install-dependencies")
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = True
+    return (is_error, has_changed, meta)
+
+
+def dokku_plugin_absent(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": True, "uninstalled": []}
+
+    installed, error = dokku_plugin_list()
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    for plugin in data["plugins"]:
+        name = plugin.get("name")
+        if name not in installed:
+            continue
+
+        error = dokku_plugin_run("dokku plugin:uninstall {0}".format(pipes.quote(name)))
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        has_changed = True
+        meta["uninstalled"].append(name)
+
+    is_error = False
+    meta["present"] = False
+    return (is_error, has_changed, meta)
+
+
+def main():
+    fields = {
+        "plugins": {"required": True, "type": "list"},
+        "state": {
+            "required": False,
+            "default": "present",
+            "choices": ["present", "absent"],
+            "type": "str",
+        },
+    }
+    choice_map = {
+        "present": dokku_plugin_present,
+        "absent": dokku_plugin_absent,
+    }
+
+    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    is_error, has_changed, result = choice_map.get(module.params["state"])(
+        module.params
+    )
+
+    if is_error:
+        module.fail_json(msg=result["error"], meta=result)
+    module.exit_json(changed=has_changed, meta=result)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,43 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_utils import dokku_report, run_per_app, subprocess_error
 import subprocess
 
 DOCUMENTATION = """
 ---
 module: dokku_proxy
 short_description: Enable or disable the proxy for a dokku app
+description:
+  - Reads `proxy:report` once, for every app in bulk mode, and only enables,
+    disables or switches the proxy of apps that differ.
 options:
   app:
     description:
-      - The name of the app
-    required: True
+      - The name of the app. Required unless `apps` is set.
+    required: False
     default: null
     aliases: []
+  apps:
+    description:
+      - A list of apps to manage in a single task, instead of `app`
+    required: False
+    default: []
+    aliases: []
+  type:
+    description:
+      - >
+        The proxy implementation to use (e.g. `nginx`, `haproxy`, `caddy`,
+        `traefik`). Left untouched when not set.
+    required: False
+    default: null
+    aliases: []
+  parallelism:
+    description:
+      - Maximum number of apps updated at the same time when using `apps`
+    required: False
+    default: 4
+    aliases: []
   state:
     description:
       - The state of the proxy
@@ -35,66 +58,107 @@ EXAMPLES = """
   dokku_proxy:
     app: hello-world
     state: absent
+
+- name: Move several apps to the caddy proxy
+  dokku_proxy:
+    apps:
+      - hello-world
+      - other-app
+    type: caddy
 """
 
 
-def dokku_proxy(data):
-    command = "dokku --quiet config:get {0} DOKKU_DISABLE_PROXY"
-    response, error = subprocess_check_output(command.format(data["app"]))
-    if error:
-        return "0", error
-    return response[0], error
+def dokku_proxy_reconcile(app, report, data):
+    """Enable, disable or switch the proxy of a single app.
 
+    Returns the list of changes made so far and the first error, if any.
+    """
+    changes = []
+    if report is None:
+        return changes, "Unable to find the proxy report of {0}".format(app)
 
-def dokku_proxy_present(data):
-    is_error = True
-    has_changed = False
-    meta = {"present": False}
+    commands = []
+    if data["type"] and report.get("type") != data["type"]:
+        command = "dokku --quiet proxy:set {0} {1}".format(app, data["type"])
+        commands.append(("set", command))
 
-    disabled, error = dokku_proxy(data)
-    if disabled == "0":
-        is_error = False
-        meta["present"] = True
-        return (is_error, has_changed, meta)
+    enabled = report.get("enabled") == "true"
+    if data["state"] == "present" and not enabled:
+        commands.append(("enable", "dokku --quiet proxy:enable {0}".format(app)))
+    elif data["state"] == "absent" and enabled:
+        commands.append(("disable", "dokku --force proxy:disable {0}".format(app)))
 
-    command = "dokku --quiet proxy:enable {0}".format(data["app"])
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
-        has_changed = True
-        meta["present"] = True
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
+    for change, command in commands:
+        try:
+            subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+            changes.append(change)
+        except subprocess.CalledProcessError as e:
+            return changes, subprocess_error(e)
 
-    return (is_error, has_changed, meta)
+    return changes, None
 
 
-def dokku_proxy_absent(data=None):
+def dokku_proxy_set(data):
     is_error = True
     has_changed = False
-    meta = {"present": True}
+    meta = {"present": data["state"] == "absent"}
+
+    if not data["apps"]:
+        report, error = dokku_report("proxy", data["app"])
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+
+        changes, error = dokku_proxy_reconcile(
+            data["app"], report.get(data["app"]), data
+        )
+        has_changed = len(changes) > 0
+        meta["changed"] = changes
+        if error is not None:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
 
-    disabled, error = dokku_proxy(data)
-    if disabled == "1":
         is_error = False
-        meta["present"] = False
+        meta["present"] = data["state"] == "present"
         return (is_error, has_changed, meta)
 
-    command = "dokku --force proxy:disable {0}".format(data["app"])
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
-        has_changed = True
-        meta["present"] = False
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
+    report, error = dokku_report("proxy")
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
 
+    meta.update({"changed": {}, "errors": {}})
+    apps = sorted(set(data["apps"]))
+
+    def reconcile(app):
+        return dokku_proxy_reconcile(app, report.get(app), data)
+
+    for app, (changes, error) in zip(
+        apps, run_per_app(reconcile, apps, parallelism=data["parallelism"])
+    ):
+        if changes:
+            meta["changed"][app] = changes
+        if error is not None:
+            meta["errors"][app] = error
+
+    has_changed = len(meta["changed"]) > 0
+    if len(meta["errors"]) > 0:
+        meta["error"] = "Unable to update the proxy of: {0}".format(
+            ", ".join(sorted(meta["errors"].keys()))
+        )
+        return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = data["state"] == "present"
     return (is_error, has_changed, meta)
 
 
 def main():
     fields = {
-        "app": {"required": True, "type": "str"},
+        "app": {"required": False, "type": "str"},
+        "apps": {"required": False, "default": [], "type": "list"},
+        "type": {"required": False, "type": "str"},
+        "parallelism": {"required": False, "default": 4, "type": "int"},
         "state": {
             "required": False,
             "default": "present",
@@ -102,15 +166,14 @@ def main():
             "type": "str",
         },
     }
-    choice_map = {
-        "present": dokku_proxy_present,
-        "absent": dokku_proxy_absent,
-    }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
-    is_error, has_changed, result = choice_map.get(module.params["state"])(
-        module.params
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["app", "apps"]],
+        mutually_exclusive=[["app", "apps"]],
+        supports_check_mode=False,
     )
+    is_error, has_changed, result = dokku_proxy_set(module.params)
 
     if is_error:
         module.fail_json(msg=result["error"], meta=result)
@@ -1,7 +1,9 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.dokku_utils import subprocess_check_output
+from ansible.module_utils.dokku_utils import dokku_report, subprocess_check_output
+import base64
+import json
 import pipes
 import re
 import subprocess
@@ -10,13 +12,23 @@ DOCUMENTATION = """
 ---
 module: dokku_registry
 short_description: Manage the registry configuration for a given dokku application
+description:
+  - >
+    Credentials are compared against the auths of the docker config of the
+    dokku user, and only the settings that differ from `registry:report` are set.
 options:
   app:
     description:
-      - The name of the app
-    required: True
+      - The name of the app. This is required only if global is set to False.
+    required: False
     default: null
     aliases: []
+  global:
+    description:
+      - Whether to change the global registry settings
+    required: False
+    default: False
+    aliases: []
   image:
     description:
       - Alternative to app name for image repository name
@@ -24,19 +36,31 @@ options:
     aliases: []
   password:
     description:
-      - The registry password (required for 'present' state)
+      - The registry password
     required: False
     aliases: []
+  push_on_release:
+    description:
+      - Whether to push the image to the registry on every release
+    required: False
+    default: null
+    aliases: []
   server:
     description:
-      - The registry server hostname (required for 'present' state)
+      - The registry server hostname (required for 'present' state of an app)
     required: False
     aliases: []
   username:
     description:
-      - The registry username (required for 'present' state)
+      - The registry username
     required: False
     aliases: []
+  docker_config:
+    description:
+      - The docker config file holding the registry credentials of the dokku user
+    required: False
+    default: /home/dokku/.docker/config.json
+    aliases: []
   state:
     description:
       - The state of the registry integration
@@ -69,6 +93,12 @@ EXAMPLES = """
   dokku_registry:
     app: hello-world
     state: absent
+
+- name: registry:set --global
+  dokku_registry:
+    global: true
+    server: registry.example.com
+    push_on_release: true
 """
 
 
@@ -80,17 +110,41 @@ def to_str(v):
     return "true" if v else "false"
 
 
+def dokku_module_target(data):
+    return "--global" if data.get("global") else data["app"]
+
+
+def dokku_registry_logged_in(data):
+    """Check the credentials against the docker auths of the dokku user."""
+    if not data.get("username") or not data.get("password") or not data.get("server"):
+        return False
+
+    try:
+        with open(data["docker_config"]) as f:
+            auths = json.load(f).get("auths", {})
+    except (IOError, OSError, ValueError, AttributeError):
+        return False
+
+    credentials = "{0}:{1}".format(data["username"], data["password"])
+    auth = base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+    for server in [data["server"], "https://{0}".format(data["server"])]:
+        entry = auths.get(server) or auths.get("{0}/".format(server)) or {}
+        if entry.get("auth") == auth:
+            return True
+    return False
+
+
 def dokku_module_set(command_prefix, data, key, value=None):
     has_changed = False
     error = None
 
     if value:
         command = "dokku --quiet {0}:set {1} {2} {3}".format(
-            command_prefix, data["app"], key, pipes.quote(value)
+            command_prefix, dokku_module_target(data), key, pipes.quote(value)
         )
     else:
         command = "dokku --quiet {0}:set {1} {2}".format(
-            command_prefix, data["app"], key
+            command_prefix, dokku_module_target(data), key
         )
 
     try:
@@ -122,7 +176,7 @@ def dokku_module_set_blank(command_prefix, data, setable_fields):
     return (has_changed, changed_keys, error)
 
 
-def dokku_module_set_values(command_prefix, data, report, setable_fields):
+def dokku_module_set_values(command_prefix, data, report, setable_fields, skip=()):
     error = None
     errors = []
     changed_keys = []
@@ -134,7 +188,7 @@ def dokku_module_set_values(command_prefix, data, report, setable_fields):
         report["enabled"] = to_str(report["enabled"])
 
     for key, value in report.items():
-        if key not in setable_fields:
+        if key not in setable_fields or key in skip:
             continue
         if data.get(key, None) is None:
             continue
@@ -169,7 +223,25 @@ def dokku_module_require_fields(data, required_fields):
     return error
 
 
+def dokku_module_report_global(command_prefix, allowed_report_keys):
+    reports, error = dokku_report(command_prefix)
+    if error is not None:
+        return reports, error
+
+    # global values are part of the report of every app
+    values = list(reports.values())[0] if reports else {}
+    report = {}
+    for key in allowed_report_keys:
+        if key != "enabled":
+            report[key] = values.get("global-{0}".format(key))
+    report["enabled"] = any(report.values())
+    return report, error
+
+
 def dokku_module_report(command_prefix, data, re_compiled, allowed_report_keys):
+    if data.get("global"):
+        return dokku_module_report_global(command_prefix, allowed_report_keys)
+
     command = "dokku --quiet {0}:report {1}".format(command_prefix, data["app"])
     output, error = subprocess_check_output(command)
     if error is not None:
@@ -247,6 +319,8 @@ def dokku_module_present(
     meta = {"present": False, "changed": []}
 
     data["enabled"] = "true"
+    if data.get("push_on_release") is not None:
+        data["push-on-release"] = to_str(data["push_on_release"])
     error = dokku_module_require_fields(data, required_present_fields)
     if error:
         meta["error"] = error
@@ -259,8 +333,13 @@ def dokku_module_present(
         meta["error"] = error
         return (is_error, has_changed, meta)
 
+    # credentials the dokku user is already logged in with are not set again
+    skip = []
+    if dokku_registry_logged_in(data):
+        skip = ["password", "username"]
+
     has_changed, changed_keys, error = dokku_module_set_values(
-        command_prefix, data, report, setable_fields
+        command_prefix, data, report, setable_fields, skip
     )
     if error:
         meta["error"] = error
@@ -276,11 +355,18 @@ def dokku_module_present(
 
 def main():
     fields = {
-        "app": {"required": True, "type": "str"},
+        "app": {"required": False, "type": "str"},
+        "global": {"required": False, "default": False, "type": "bool"},
         "image": {"required": False, "type": "str"},
-        "password": {"required": True, "type": "str", "no_log": True},
+        "password": {"required": False, "type": "str", "no_log": True},
+        "push_on_release": {"required": False, "type": "bool"},
         "server": {"required": False, "type": "str"},
-        "username": {"required": True, "type": "str"},
+        "username": {"required": False, "type": "str"},
+        "docker_config": {
+            "required": False,
+            "default": "/home/dokku/.docker/config.json",
+            "type": "str",
+        },
         "state": {
             "required": False,
             "default": "present",
@@ -293,13 +379,27 @@ def main():
         "present": dokku_module_present,
     }
 
-    allowed_report_keys = ["enabled", "password", "image", "server", "username"]
+    allowed_report_keys = [
+        "enabled",
+        "password",
+        "image",
+        "push-on-release",
+        "server",
+        "username",
+    ]
     command_prefix = "registry"
-    required_present_fields = ["password", "server", "username"]
-    setable_fields = ["image", "password", "server", "username"]
+    setable_fields = ["image", "password", "push-on-release", "server", "username"]
     RE_PREFIX = re.compile("^registry-")
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_together=[["username", "password"]],
+        supports_check_mode=False,
+    )
+    if module.params["global"] == bool(module.params["app"]):
+        module.fail_json(msg='Exactly one of "app" or "global" must be provided.')
+
+    required_present_fields = [] if module.params["global"] else ["server"]
     is_error, has_changed, result = choice_map.get(module.params["state"])(
         command_prefix=command_prefix,
         data=module.params,
@@ -1,7 +1,10 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_service import dokku_service_list
+from ansible.module_utils.dokku_utils import run_concurrently
 import subprocess
+import time
 
 DOCUMENTATION = """
 ---
@@ -10,16 +13,29 @@ short_description: Creates a given service
 options:
   name:
     description:
-      - The name of the service
-    required: True
+      - The name of the service (required unless `services` is set)
+    required: False
     default: null
     aliases: []
   service:
     description:
-      - The type of service to create
-    required: True
+      - The type of service to create (required unless `services` is set)
+    required: False
     default: null
     aliases: []
+  services:
+    description:
+      - A map of service types to lists of service names, to create many services
+        in a single task. Existing services are looked up once per service type.
+    required: False
+    default: {}
+    aliases: []
+  parallelism:
+    description:
+      - Maximum number of services created at the same time when using `services`
+    required: False
+    default: 4
+    aliases: []
 author: Jose Diaz-Gonzalez
 requirements: [ ]
 """
@@ -43,6 +59,16 @@ EXAMPLES = """
     name: default
     service: postgres
 
+- name: create many services at once
+  dokku_service_create:
+    services:
+      postgres:
+        - preview-1
+        - preview-2
+      redis:
+        - preview-1
+    parallelism: 8
+
 """
 
 
@@ -58,36 +84,95 @@ def dokku_service_exists(service, name):
     return exists, error
 
 
+def dokku_service_create_one(service, name):
+    command = "dokku {0}:create {1}".format(service, name)
+    start = time.time()
+    try:
+        subprocess.check_call(command, shell=True)
+    except subprocess.CalledProcessError as e:
+        return None, str(e)
+    return round(time.time() - start, 3), None
+
+
+def dokku_service_create_bulk(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False, "created": [], "timings": {}, "failed": {}}
+
+    missing = []
+    for service, names in sorted(data["services"].items()):
+        existing, error = dokku_service_list(service)
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        for name in names:
+            if name not in existing:
+                missing.append((service, name))
+
+    def create(item):
+        return dokku_service_create_one(*item)
+
+    results = run_concurrently(create, missing, data["parallelism"])
+    for (service, name), (duration, error) in zip(missing, results):
+        key = "{0}/{1}".format(service, name)
+        if error:
+            meta["failed"][key] = error
+            continue
+        meta["created"].append(key)
+        meta["timings"][key] = duration
+
+    has_changed = len(meta["created"]) > 0
+    if len(meta["failed"]) > 0:
+        meta["error"] = "Unable to create: {0}".format(
+            ", ".join(sorted(meta["failed"].keys()))
+        )
+        return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = True
+    return (is_error, has_changed, meta)
+
+
 def dokku_service_create(data):
     is_error = True
     has_changed = False
     meta = {"present": False}
 
+    if data["services"]:
+        return dokku_service_create_bulk(data)
+
     exists, error = dokku_service_exists(data["service"], data["name"])
     if exists:
         is_error = False
         meta["present"] = True
         return (is_error, has_changed, meta)
 
-    command = "dokku {0}:create {1}".format(data["service"], data["name"])
-    try:
-        subprocess.check_call(command, shell=True)
-        is_error = False
-        has_changed = True
-        meta["present"] = True
-    except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
+    _duration, error = dokku_service_create_one(data["service"], data["name"])
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
 
+    is_error = False
+    has_changed = True
+    meta["present"] = True
     return (is_error, has_changed, meta)
 
 
 def main():
     fields = {
-        "service": {"required": True, "type": "str"},
-        "name": {"required": True, "type": "str"},
+        "service": {"required": False, "type": "str"},
+        "name": {"required": False, "type": "str"},
+        "services": {"required": False, "default": {}, "type": "dict"},
+        "parallelism": {"required": False, "default": 4, "type": "int"},
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["name", "services"]],
+        required_together=[["name", "service"]],
+        mutually_exclusive=[["name", "services"], ["service", "services"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = dokku_service_create(module.params)
 
     if is_error:
@@ -0,0 +1,341 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.dokku_service import dokku_service_list
+import errno
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+DOCUMENTATION = """
+---
+module: dokku_service_data
+short_description: Export or import the data of a given service
+description:
+  - Streams `<service>:export` to a file or a file into `<service>:import` in
+    fixed size chunks, so dumps are never held in memory.
+  - Dumps can be compressed with gzip or zstd and are verified against a
+    sha256 checksum file written next to the dump.
+options:
+  name:
+    description:
+      - The name of the service
+    required: True
+    default: null
+    aliases: []
+  service:
+    description:
+      - The type of service
+    required: True
+    default: null
+    aliases: []
+  path:
+    description:
+      - Path of the dump file to write on export or read on import
+    required: True
+    default: null
+    aliases: []
+  compression:
+    description:
+      - Compression applied to the dump file. zstd requires the `zstd` binary.
+    required: False
+    default: none
+    choices: [ "none", "gzip", "zstd" ]
+    aliases: []
+  checksum:
+    description:
+      - Whether to write a `<path>.sha256` file on export and verify it on import
+    required: False
+    default: True
+    aliases: []
+  force:
+    description:
+      - >
+        Whether to overwrite an existing dump file on export, or to import a
+        dump that was already imported into the service
+    required: False
+    default: False
+    aliases: []
+  state_file:
+    description:
+      - >
+        File recording the checksum of the last dump imported into each
+        service, so the same dump is not imported again on every run
+    required: False
+    default: /var/lib/dokku/data/ansible/service-data.json
+    aliases: []
+  state:
+    description:
+      - Whether to export the service data to `path` or import it from `path`
+    required: False
+    default: exported
+    choices: [ "exported", "imported" ]
+    aliases: []
+author: Jose Diaz-Gonzalez
+requirements: [ ]
+"""
+
+EXAMPLES = """
+- name: postgres:export default > /var/backups/default.dump.zst
+  dokku_service_data:
+    name: default
+    service: postgres
+    path: /var/backups/default.dump.zst
+    compression: zstd
+
+- name: postgres:import default < /var/backups/default.dump.zst
+  dokku_service_data:
+    name: default
+    service: postgres
+    path: /var/backups/default.dump.zst
+    compression: zstd
+    state: imported
+"""
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def dokku_service_data_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dokku_service_data_stream(source, destination):
+    """Copy `source` to `destination` in chunks, returning the byte count."""
+    size = 0
+    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+        destination.write(chunk)
+        size += len(chunk)
+    return size
+
+
+def dokku_service_data_state_load(state_file):
+    """Load the checksums of the imported dumps as a map of service/name => sha256."""
+    if not os.path.exists(state_file):
+        return {}
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def dokku_service_data_state_save(state_file, state):
+    directory = os.path.dirname(state_file)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp_file = "{0}.tmp".format(state_file)
+    with open(tmp_file, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.rename(tmp_file, state_file)
+
+
+def dokku_service_data_exists(data):
+    names, error = dokku_service_list(data["service"])
+    if error:
+        return error
+    if data["name"] not in names:
+        return "{0} service {1} does not exist".format(data["service"], data["name"])
+    return None
+
+
+def dokku_service_data_export(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False}
+
+    if os.path.exists(data["path"]) and not data["force"]:
+        is_error = False
+        meta["present"] = True
+        return (is_error, has_changed, meta)
+
+    error = dokku_service_data_exists(data)
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    tmp_path = "{0}.tmp".format(data["path"])
+    command = ["dokku", "--quiet", "{0}:export".format(data["service"]), data["name"]]
+    # stderr goes to a file so a chatty command cannot block on a full pipe
+    stderr = tempfile.TemporaryFile()
+    export = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+    compressor = None
+    try:
+        with open(tmp_path, "wb") as f:
+            if data["compression"] == "zstd":
+                compressor = subprocess.Popen(
+                    ["zstd", "-q", "-c"], stdin=export.stdout, stdout=f
+                )
+                # let zstd own the pipe so export gets SIGPIPE if zstd dies
+                export.stdout.close()
+                compressor.wait()
+            elif data["compression"] == "gzip":
+                with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                    dokku_service_data_stream(export.stdout, gz)
+            else:
+                dokku_service_data_stream(export.stdout, f)
+        export.wait()
+    except (IOError, OSError) as e:
+        export.kill()
+        export.wait()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        meta["error"] = str(e)
+        return (is_error, has_changed, meta)
+
+    if export.returncode != 0 or (compressor and compressor.returncode != 0):
+        os.remove(tmp_path)
+        stderr.seek(0)
+        meta["error"] = stderr.read().decode("utf-8", "replace") or "export failed"
+        return (is_error, has_changed, meta)
+
+    os.rename(tmp_path, data["path"])
+    meta["size"] = os.path.getsize(data["path"])
+    if data["checksum"]:
+        meta["checksum"] = dokku_service_data_checksum(data["path"])
+        with open("{0}.sha256".format(data["path"]), "w") as f:
+            f.write(
+                "{0}  {1}\n".format(meta["checksum"], os.path.basename(data["path"]))
+            )
+
+    is_error = False
+    has_changed = True
+    meta["present"] = True
+    return (is_error, has_changed, meta)
+
+
+def dokku_service_data_import(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False}
+
+    if not os.path.exists(data["path"]):
+        meta["error"] = "{0} does not exist".format(data["path"])
+        return (is_error, has_changed, meta)
+
+    meta["checksum"] = dokku_service_data_checksum(data["path"])
+    if data["checksum"]:
+        checksum_path = "{0}.sha256".format(data["path"])
+        try:
+            with open(checksum_path) as f:
+                expected = f.read().split()[0]
+        except (IOError, OSError, IndexError):
+            meta["error"] = "Unable to read checksum file {0}".format(checksum_path)
+            return (is_error, has_changed, meta)
+        if meta["checksum"] != expected:
+            meta["error"] = "Checksum mismatch for {0}".format(data["path"])
+            return (is_error, has_changed, meta)
+
+    # the same dump is only imported again when forced
+    state = dokku_service_data_state_load(data["state_file"])
+    key = "{0}/{1}".format(data["service"], data["name"])
+    if state.get(key) == meta["checksum"] and not data["force"]:
+        is_error = False
+        meta["present"] = True
+        return (is_error, has_changed, meta)
+
+    error = dokku_service_data_exists(data)
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    command = ["dokku", "--quiet", "{0}:import".format(data["service"]), data["name"]]
+    stderr = tempfile.TemporaryFile()
+    decompressor = None
+    broken_pipe = False
+    try:
+        with open(data["path"], "rb") as f:
+            if data["compression"] == "zstd":
+                decompressor = subprocess.Popen(
+                    ["zstd", "-q", "-d", "-c"], stdin=f, stdout=subprocess.PIPE
+                )
+                source = decompressor.stdout
+            elif data["compression"] == "gzip":
+                source = gzip.GzipFile(fileobj=f, mode="rb")
+            else:
+                source = f
+
+            target = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=stderr)
+            try:
+                shutil.copyfileobj(source, target.stdin, CHUNK_SIZE)
+                target.stdin.close()
+            except (IOError, OSError) as e:
+                # the import exited early, its stderr tells why
+                if e.errno != errno.EPIPE:
+                    raise
+                broken_pipe = True
+            target.wait()
+            if decompressor:
+                decompressor.stdout.close()
+                decompressor.wait()
+    except (IOError, OSError) as e:
+        meta["error"] = str(e)
+        return (is_error, has_changed, meta)
+
+    if (
+        broken_pipe
+        or target.returncode != 0
+        or (decompressor and decompressor.returncode != 0)
+    ):
+        stderr.seek(0)
+        meta["error"] = stderr.read().decode("utf-8", "replace") or "import failed"
+        return (is_error, has_changed, meta)
+
+    state[key] = meta["checksum"]
+    dokku_service_data_state_save(data["state_file"], state)
+
+    is_error = False
+    has_changed = True
+    meta["present"] = True
+    return (is_error, has_changed, meta)
+
+
+def main():
+    fields = {
+        "name": {"required": True, "type": "str"},
+        "service": {"required": True, "type": "str"},
+        "path": {"required": True, "type": "str"},
+        "compression": {
+            "required": False,
+            "default": "none",
+            "choices": ["none", "gzip", "zstd"],
+            "type": "str",
+        },
+        "checksum": {"required": False, "default": True, "type": "bool"},
+        "force": {"required": False, "default": False, "type": "bool"},
+        "state_file": {
+            "required": False,
+            "default": "/var/lib/dokku/data/ansible/service-data.json",
+            "type": "str",
+        },
+        "state": {
+            "required": False,
+            "default": "exported",
+            "choices": ["exported", "imported"],
+            "type": "str",
+        },
+    }
+    choice_map = {
+        "exported": dokku_service_data_export,
+        "imported": dokku_service_data_import,
+    }
+
+    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    is_error, has_changed, result = choice_map.get(module.params["state"])(
+        module.params
+    )
+
+    if is_error:
+        module.fail_json(msg=result["error"], meta=result)
+    module.exit_json(changed=has_changed, meta=result)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.dokku_app import dokku_apps_exists
+from ansible.module_utils.dokku_service import dokku_service_links
 import subprocess
 
 DOCUMENTATION = """
@@ -11,22 +12,43 @@ short_description: Links and unlinks a given service to an application
 options:
   app:
     description:
-      - The name of the app
-    required: True
+      - The name of the app (required unless `links` is set)
+    required: False
     default: null
     aliases: []
   name:
     description:
-      - The name of the service
-    required: True
+      - The name of the service (required unless `links` is set)
+    required: False
     default: null
     aliases: []
   service:
     description:
-      - The type of service to link
-    required: True
+      - The type of service to link (required unless `links` is set)
+    required: False
     default: null
     aliases: []
+  links:
+    description:
+      - A list of links, each with `app`, `name` and `service` keys. The current
+        links are read once per service and only the difference is applied.
+    required: False
+    default: []
+    aliases: []
+  exclusive:
+    description:
+      - When using `links` with the `present` state, unlink apps from the listed
+        services if they are not in `links`
+    required: False
+    default: False
+    aliases: []
+  restart:
+    description:
+      - When using `links`, whether to restart each changed app once after all
+        of its links have been updated
+    required: False
+    default: True
+    aliases: []
   state:
     description:
       - The state of the service link
@@ -57,6 +79,20 @@ EXAMPLES = """
     name: default
     service: redis
     state: absent
+
+- name: link a whole environment, removing any other links to these services
+  dokku_service_link:
+    links:
+      - app: hello-world
+        name: default
+        service: postgres
+      - app: hello-world
+        name: default
+        service: redis
+      - app: worker
+        name: default
+        service: redis
+    exclusive: true
 """
 
 
@@ -84,11 +120,78 @@ def dokku_service_linked(service, name, app):
     return linked, error
 
 
+def dokku_service_link_graph(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False, "linked": [], "unlinked": [], "restarted": []}
+
+    desired = set()
+    for link in data["links"]:
+        missing = [k for k in ["app", "name", "service"] if not link.get(k)]
+        if missing:
+            meta["error"] = "missing required link keys: {0}".format(", ".join(missing))
+            return (is_error, has_changed, meta)
+        desired.add((link["service"], link["name"], link["app"]))
+
+    actual = set()
+    for service, name in sorted(set((s, n) for s, n, _ in desired)):
+        apps, error = dokku_service_links(service, name)
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        actual.update((service, name, app) for app in apps)
+
+    if data["state"] == "absent":
+        to_link = set()
+        to_unlink = desired & actual
+    else:
+        to_link = desired - actual
+        to_unlink = actual - desired if data["exclusive"] else set()
+
+    operations = {}
+    for edge in to_unlink:
+        operations.setdefault(edge[2], []).append(("unlink", edge))
+    for edge in to_link:
+        operations.setdefault(edge[2], []).append(("link", edge))
+
+    for app, edges in sorted(operations.items()):
+        for action, (service, name, _) in sorted(edges):
+            command = "dokku --quiet {0}:{1} --no-restart {2} {3}".format(
+                service, action, name, app
+            )
+            try:
+                subprocess.check_call(command, shell=True)
+                has_changed = True
+                meta["{0}ed".format(action)].append(
+                    "{0}/{1}:{2}".format(service, name, app)
+                )
+            except subprocess.CalledProcessError as e:
+                meta["error"] = str(e)
+                return (is_error, has_changed, meta)
+
+        if not data["restart"]:
+            continue
+        command = "dokku --quiet ps:restart {0}".format(app)
+        try:
+            subprocess.check_call(command, shell=True)
+            meta["restarted"].append(app)
+        except subprocess.CalledProcessError as e:
+            meta["error"] = str(e)
+            return (is_error, has_changed, meta)
+
+    is_error = False
+    meta["present"] = data["state"] == "present"
+    return (is_error, has_changed, meta)
+
+
 def dokku_service_link_absent(data):
     is_error = True
     has_changed = False
     meta = {"present": False}
 
+    if data["links"]:
+        return dokku_service_link_graph(data)
+
     exists, error = dokku_service_exists(data["service"], data["name"])
     if not exists:
         meta["error"] = error
@@ -123,6 +226,9 @@ def dokku_service_link_present(data):
     has_changed = False
     meta = {"present": False}
 
+    if data["links"]:
+        return dokku_service_link_graph(data)
+
     exists, error = dokku_service_exists(data["service"], data["name"])
     if not exists:
         meta["error"] = error
@@ -154,9 +260,12 @@ def dokku_service_link_present(data):
 
 def main():
     fields = {
-        "app": {"required": True, "type": "str"},
-        "name": {"required": True, "type": "str"},
-        "service": {"required": True, "type": "str"},
+        "app": {"required": False, "type": "str"},
+        "name": {"required": False, "type": "str"},
+        "service": {"required": False, "type": "str"},
+        "links": {"required": False, "default": [], "type": "list"},
+        "exclusive": {"required": False, "default": False, "type": "bool"},
+        "restart": {"required": False, "default": True, "type": "bool"},
         "state": {
             "required": False,
             "default": "present",
@@ -169,7 +278,13 @@ def main():
         "absent": dokku_service_link_absent,
     }
 
-    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    module = AnsibleModule(
+        argument_spec=fields,
+        required_one_of=[["app", "links"]],
+        required_together=[["app", "name", "service"]],
+        mutually_exclusive=[["app", "links"]],
+        supports_check_mode=False,
+    )
     is_error, has_changed, result = choice_map.get(module.params["state"])(
         module.params
     )
@@ -0,0 +1,239 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from ansible.module_utils.basic import AnsibleModule
+import base64
+import binascii
+import hashlib
+import pipes
+import re
+import subprocess
+
+DOCUMENTATION = """
+---
+module: dokku_ssh_keys
+short_description: Manage the ssh keys allowed to push to dokku
+description:
+  - Reads `ssh-keys:list` once and compares key fingerprints, only adding,
+    replacing or removing the keys that differ.
+options:
+  users:
+    description:
+      - A list of users, each with a `username` and a public `ssh_key`
+    required: True
+    default: []
+    aliases: []
+  exclusive:
+    description:
+      - >
+        Whether to remove every key whose name is not listed in `users`.
+        This includes the `admin` key added during the dokku installation.
+    required: False
+    default: False
+    aliases: []
+  state:
+    description:
+      - The state of the ssh keys
+    required: False
+    default: present
+    choices: [ "present", "absent" ]
+    aliases: []
+author: Jose Diaz-Gonzalez
+requirements: [ ]
+"""
+
+EXAMPLES = """
+- name: Allow jane and camilla to push
+  dokku_ssh_keys:
+    users:
+      - username: jane
+        ssh_key: ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIP...
+      - username: camilla
+        ssh_key: ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABAQ...
+
+- name: Allow only jane to push
+  dokku_ssh_keys:
+    users:
+      - username: jane
+        ssh_key: ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIP...
+    exclusive: true
+
+- name: Remove the key of camilla
+  dokku_ssh_keys:
+    users:
+      - username: camilla
+    state: absent
+"""
+
+RE_KEY = re.compile(r'^(\S+)\s+NAME="([^"]*)"')
+
+
+def dokku_ssh_keys_fingerprint(ssh_key):
+    """Get the `SHA256:` fingerprint ssh-keygen reports for a public key."""
+    for token in ssh_key.split():
+        try:
+            blob = base64.b64decode(token.encode("ascii"), validate=True)
+        except (binascii.Error, ValueError, UnicodeEncodeError):
+            continue
+        # the key blob starts with the length prefixed key type
+        if len(blob) > 4 and blob[4:8] in [b"ssh-", b"ecds", b"sk-s", b"sk-e"]:
+            digest = base64.b64encode(hashlib.sha256(blob).digest())
+            return "SHA256:{0}".format(digest.decode("ascii").rstrip("="))
+    return None
+
+
+def dokku_ssh_keys_list():
+    """Get the installed keys as a map of name => fingerprint."""
+    process = subprocess.run(
+        ["dokku", "ssh-keys:list"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    if process.returncode != 0:
+        if "No public keys found" in process.stdout:
+            return {}, None
+        return None, process.stdout.strip() or "Unable to list ssh keys"
+
+    keys = {}
+    for line in process.stdout.splitlines():
+        match = RE_KEY.match(line.strip())
+        if match:
+            keys[match.group(2)] = match.group(1)
+    return keys, None
+
+
+def dokku_ssh_keys_add(username, ssh_key):
+    process = subprocess.run(
+        ["dokku", "ssh-keys:add", username],
+        input=ssh_key.strip() + "\n",
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    if process.returncode != 0:
+        return process.stdout.strip() or "Unable to add ssh key {0}".format(username)
+    return None
+
+
+def dokku_ssh_keys_remove(username):
+    command = "dokku ssh-keys:remove {0}".format(pipes.quote(username))
+    try:
+        subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+    except subprocess.CalledProcessError as e:
+        return str(e.output)
+    return None
+
+
+def dokku_ssh_keys_present(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": False, "added": [], "replaced": [], "removed": []}
+
+    keys, error = dokku_ssh_keys_list()
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    wanted = {}
+    for user in data["users"]:
+        username, ssh_key = user.get("username"), user.get("ssh_key")
+        if not username or not ssh_key:
+            meta["error"] = "Each user requires a username and an ssh_key"
+            return (is_error, has_changed, meta)
+        fingerprint = dokku_ssh_keys_fingerprint(ssh_key)
+        if fingerprint is None:
+            meta["error"] = "Invalid ssh_key for user {0}".format(username)
+            return (is_error, has_changed, meta)
+        wanted[username] = (fingerprint, ssh_key)
+
+    # stale keys are removed first, as dokku refuses duplicate keys
+    removals = []
+    if data["exclusive"]:
+        removals = [name for name in sorted(keys) if name not in wanted]
+    for name in removals:
+        error = dokku_ssh_keys_remove(name)
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        has_changed = True
+        meta["removed"].append(name)
+
+    for username, (fingerprint, ssh_key) in wanted.items():
+        if keys.get(username) == fingerprint:
+            continue
+
+        if username in keys:
+            error = dokku_ssh_keys_remove(username)
+            if error:
+                meta["error"] = error
+                return (is_error, has_changed, meta)
+            meta["replaced"].append(username)
+        else:
+            meta["added"].append(username)
+
+        error = dokku_ssh_keys_add(username, ssh_key)
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        has_changed = True
+
+    is_error = False
+    meta["present"] = True
+    return (is_error, has_changed, meta)
+
+
+def dokku_ssh_keys_absent(data):
+    is_error = True
+    has_changed = False
+    meta = {"present": True, "removed": []}
+
+    keys, error = dokku_ssh_keys_list()
+    if error:
+        meta["error"] = error
+        return (is_error, has_changed, meta)
+
+    for user in data["users"]:
+        username = user.get("username")
+        if username not in keys:
+            continue
+
+        error = dokku_ssh_keys_remove(username)
+        if error:
+            meta["error"] = error
+            return (is_error, has_changed, meta)
+        has_changed = True
+        meta["removed"].append(username)
+
+    is_error = False
+    meta["present"] = False
+    return (is_error, has_changed, meta)
+
+
+def main():
+    fields = {
+        "users": {"required": True, "type": "list"},
+        "exclusive": {"required": False, "default": False, "type": "bool"},
+        "state": {
+            "required": False,
+            "default": "present",
+            "choices": ["present", "absent"],
+            "type": "str",
+        },
+    }
+    choice_map = {
+        "present": dokku_ssh_keys_present,
+        "absent": dokku_ssh_keys_absent,
+    }
+
+    module = AnsibleModule(argument_spec=fields, supports_check_mode=False)
+    is_error, has_changed, result = choice_map.get(module.params["state"])(
+        module.params
+    )
+
+    if is_error:
+        module.fail_json(msg=result["error"], meta=result)
+    module.exit_json(changed=has_changed, meta=result)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,38 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 """Shared functions for managing dokku apps"""
-
 import subprocess
 
+from ansible.module_utils.dokku_utils import subprocess_check_output, subprocess_error
+
+_APPS_INDEX = None
+
+
+def dokku_apps_index(refresh=False):
+    """Get the names of all apps with one `apps:list`.
+
+    The result is memoized for the lifetime of the module and kept up to
+    date by `dokku_app_ensure_present` and `dokku_app_ensure_absent`.
+    """
+    global _APPS_INDEX
+    if _APPS_INDEX is not None and not refresh:
+        return _APPS_INDEX, None
+
+    command = "dokku --quiet apps:list"
+    output, error = subprocess_check_output(command)
+    if error is not None:
+        return None, error
+
+    # older versions print a header even when quiet
+    _APPS_INDEX = set(line for line in output if not line.startswith("=====>"))
+    return _APPS_INDEX, error
+
 
 def dokku_apps_exists(app):
+    apps, error = dokku_apps_index()
+    if error is None:
+        return app in apps, None
+
     exists = False
     error = None
     command = "dokku --quiet apps:exists {0}".format(app)
@@ -32,12 +59,14 @@ def dokku_app_ensure_present(data):
 
     command = "dokku apps:create {0}".format(data["app"])
     try:
-        subprocess.check_call(command, shell=True)
+        subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+        if _APPS_INDEX is not None:
+            _APPS_INDEX.add(data["app"])
         is_error = False
         has_changed = True
         meta["present"] = True
     except subprocess.CalledProcessError as e:
-        meta["error"] = str(e.output)
+        meta["error"] = subprocess_error(e)
 
     return (is_error, has_changed, meta)
 
@@ -56,11 +85,26 @@ def dokku_app_ensure_absent(data=None):
 
     command = "dokku --force apps:destroy {0}".format(data["app"])
     try:
-        subprocess.check_call(command, shell=True)
+        subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+        if _APPS_INDEX is not None:
+            _APPS_INDEX.discard(data["app"])
         is_error = False
         has_changed = True
         meta["present"] = False
     except subprocess.CalledProcessError as e:
-        meta["error"] = str(e)
+        meta["error"] = subprocess_error(e)
 
     return (is_error, has_changed, meta)
+
+
+def dokku_app_clone(template, app):
+    """Clone the `template` app into `app` without deploying it."""
+    command = "dokku --quiet apps:clone --skip-deploy {0} {1}".format(template, app)
+    try:
+        subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+    except subprocess.CalledProcessError as e:
+        return subprocess_error(e)
+
+    if _APPS_INDEX is not None:
+        _APPS_INDEX.add(app)
+    return None
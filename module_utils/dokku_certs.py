@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Utility functions for inspecting dokku ssl certificates"""
+import calendar
+import json
+import os
+import re
+import ssl
+import subprocess
+import time
+
+from ansible.module_utils.dokku_utils import subprocess_check_output
+
+try:
+    from cryptography import x509
+    from cryptography.x509.oid import ExtensionOID, NameOID
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+
+# Parse a PEM certificate file with the `openssl` binary
+def dokku_cert_decode_openssl(path):
+    command = ["openssl", "x509", "-in", path, "-noout", "-nameopt", "RFC2253"]
+    command.extend(["-subject", "-issuer", "-startdate", "-enddate", "-serial"])
+    command.extend(["-ext", "subjectAltName"])
+    try:
+        output = subprocess.check_output(command, stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise ValueError(str(getattr(e, "output", None) or e))
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", "replace")
+
+    def flatten(name):
+        values = {}
+        for rdn in re.split(r"(?<!\\),", name):
+            if "=" in rdn:
+                key, value = rdn.split("=", 1)
+                values[key.strip()] = value.replace("\\", "")
+        return values
+
+    fields = {}
+    sans = []
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith("DNS:") or ", DNS:" in line:
+            sans.extend(v[4:] for v in line.split(", ") if v.startswith("DNS:"))
+        elif "=" in line:
+            key, value = line.split("=", 1)
+            fields[key.strip()] = value.strip()
+
+    subject = flatten(fields.get("subject", ""))
+    issuer = flatten(fields.get("issuer", ""))
+    return {
+        "subject": subject.get("CN", ""),
+        "issuer": issuer.get("O", issuer.get("CN", "")),
+        "sans": sans,
+        "serial": fields.get("serial", ""),
+        "starts_at": int(ssl.cert_time_to_seconds(fields["notBefore"])),
+        "expires_at": int(ssl.cert_time_to_seconds(fields["notAfter"])),
+    }
+
+
+# Parse a PEM certificate file with `cryptography` when it is installed
+def dokku_cert_decode_cryptography(path):
+    with open(path, "rb") as f:
+        cert = x509.load_pem_x509_certificate(f.read())
+
+    def attribute(name, oid):
+        values = name.get_attributes_for_oid(oid)
+        return values[0].value if values else None
+
+    try:
+        sans = cert.extensions.get_extension_for_oid(
+            ExtensionOID.SUBJECT_ALTERNATIVE_NAME
+        ).value.get_values_for_type(x509.DNSName)
+    except x509.ExtensionNotFound:
+        sans = []
+
+    # the naive datetimes are deprecated in recent versions
+    starts_at = getattr(cert, "not_valid_before_utc", None) or cert.not_valid_before
+    expires_at = getattr(cert, "not_valid_after_utc", None) or cert.not_valid_after
+
+    issuer = attribute(cert.issuer, NameOID.ORGANIZATION_NAME)
+    return {
+        "subject": attribute(cert.subject, NameOID.COMMON_NAME) or "",
+        "issuer": issuer or attribute(cert.issuer, NameOID.COMMON_NAME) or "",
+        "sans": list(sans),
+        "serial": "{0:X}".format(cert.serial_number),
+        "starts_at": calendar.timegm(starts_at.utctimetuple()),
+        "expires_at": calendar.timegm(expires_at.utctimetuple()),
+    }
+
+
+# Parse a PEM certificate file into its subject, issuer, sans, serial and dates
+def dokku_cert_decode(path):
+    if HAS_CRYPTOGRAPHY:
+        return dokku_cert_decode_cryptography(path)
+    return dokku_cert_decode_openssl(path)
+
+
+# Get the global-cert:report values, e.g. the `dir` holding the global certificate
+def dokku_global_cert_report():
+    command = "dokku --quiet global-cert:report"
+    output, error = subprocess_check_output(command)
+    if error is not None:
+        return output, error
+    output = [re.sub(r"\s\s+", "", line) for line in output]
+    report = {}
+
+    allowed_keys = [
+        "dir",
+        "enabled",
+        "hostnames",
+        "expires at",
+        "issuer",
+        "starts at",
+        "subject",
+        "verified",
+    ]
+    RE_PREFIX = re.compile("^global-cert-")
+    for line in output:
+        if ":" not in line:
+            continue
+        key, value = line.split(":", 1)
+        key = RE_PREFIX.sub(r"", key.replace(" ", "-").lower())
+        if key not in allowed_keys:
+            continue
+
+        if key == "enabled":
+            value = value.lower() == "true"
+        report[key] = value
+
+    return report, error
+
+
+def dokku_cert_cache_load(cache_file):
+    if not cache_file or not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        # a corrupt cache is rebuilt from scratch
+        return {}
+
+
+def dokku_cert_cache_save(cache_file, cache):
+    if not cache_file:
+        return None
+    try:
+        directory = os.path.dirname(cache_file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp_file = "{0}.tmp".format(cache_file)
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError) as e:
+        return str(e)
+    return None
+
+
+# Get certificate details for `path`, reusing `cache` entries
+# Entries are keyed by path and only reused while the file mtime and size are
+# unchanged. Returns `(None, None)` if the certificate does not exist
+def dokku_cert_info(path, cache, now=None):
+    if now is None:
+        now = int(time.time())
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        cache.pop(path, None)
+        return None, None
+
+    entry = cache.get(path)
+    if (
+        entry is None
+        or entry.get("mtime") != stat.st_mtime
+        or entry.get("size") != stat.st_size
+    ):
+        try:
+            info = dokku_cert_decode(path)
+        except (IOError, OSError, KeyError, ValueError) as e:
+            return None, "Unable to parse {0}: {1}".format(path, str(e))
+        entry = {"mtime": stat.st_mtime, "size": stat.st_size, "info": info}
+        cache[path] = entry
+
+    info = dict(entry["info"])
+    info["path"] = path
+    info["days_remaining"] = int((info["expires_at"] - now) // 86400)
+    return info, None
@@ -1,8 +1,15 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 """Utility functions for dokku git related plugins"""
+import fcntl
+import hashlib
+import os
+import re
+import shutil
 import subprocess
 
+RE_SHA = re.compile(r"^[0-9a-f]{40}$")
+
 
 def dokku_git_sha(app):
     """Get SHA of current app repository.
@@ -15,6 +22,177 @@ def dokku_git_sha(app):
             command_git_report, stderr=subprocess.STDOUT, shell=True
         )
     except subprocess.CalledProcessError:
-        sha = None
+        return None
+
+    if isinstance(sha, bytes):
+        sha = sha.decode("utf-8")
+    return sha.strip()
+
+
+def dokku_git_deployed_sha(app):
+    """Get SHA of the commit the app is deployed at.
+
+    The app repository can be ahead of the deployed commit, e.g. after a sync
+    without build or a failed build. Returns `None` if app is not deployed.
+    """
+    commands = [
+        "dokku --quiet ps:report {app} --deployed".format(app=app),
+        "dokku --quiet config:get {app} GIT_REV".format(app=app),
+    ]
+    values = []
+    for command in commands:
+        try:
+            value = subprocess.check_output(
+                command, stderr=subprocess.STDOUT, shell=True
+            )
+        except subprocess.CalledProcessError:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        values.append(value.strip())
 
+    deployed, sha = values
+    if deployed != "true" or not sha:
+        return None
     return sha
+
+
+def dokku_git_ls_remote_refs(repository, patterns=None):
+    """List the refs of `repository` matching `patterns` as a map of ref => SHA."""
+    if os.path.isdir(repository):
+        # local mirrors are owned by the dokku user and listed in full
+        command = ["git", "-C", repository]
+        command.extend(["-c", "safe.directory={0}".format(repository)])
+        command.extend(["show-ref", "--head", "--dereference"])
+    else:
+        command = ["git", "ls-remote", repository]
+        command.extend(patterns or [])
+    try:
+        output = subprocess.check_output(command, stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError) as e:
+        return None, str(e)
+
+    if isinstance(output, bytes):
+        output = output.decode("utf-8")
+
+    refs = {}
+    for line in output.splitlines():
+        parts = line.split(None, 1)
+        if len(parts) != 2:
+            continue
+        refs[parts[1]] = parts[0]
+    return refs, None
+
+
+def dokku_git_resolve(refs, version=None):
+    """Resolve `version` (tag, branch or SHA) to a SHA using listed `refs`.
+
+    Defaults to HEAD. Returns `None` if the version cannot be resolved.
+    """
+    if version and RE_SHA.match(version):
+        return version
+
+    if not version:
+        return refs.get("HEAD")
+
+    # annotated tags are listed twice, prefer the peeled commit
+    for ref in (
+        "refs/tags/{0}^{{}}".format(version),
+        "refs/tags/{0}".format(version),
+        "refs/heads/{0}".format(version),
+        version,
+    ):
+        if ref in refs:
+            return refs[ref]
+
+    return None
+
+
+def dokku_git_ls_remote(repository, version=None):
+    """Resolve `version` (tag, branch or SHA) to a SHA on the remote repository.
+
+    Defaults to the remote HEAD. Returns `(None, None)` if the version cannot
+    be resolved without fetching, e.g. for abbreviated SHAs.
+    """
+    if version and RE_SHA.match(version):
+        return version, None
+
+    patterns = [version, "{0}^{{}}".format(version)] if version else ["HEAD"]
+    refs, error = dokku_git_ls_remote_refs(repository, patterns)
+    if error:
+        return None, error
+    return dokku_git_resolve(refs, version), None
+
+
+def dokku_git_mirror_path(mirror_dir, repository):
+    """Get the path of the bare mirror cached for `repository`."""
+    digest = hashlib.sha256(repository.encode("utf-8")).hexdigest()
+    return os.path.join(mirror_dir, "{0}.git".format(digest[:16]))
+
+
+def dokku_git_mirror_size(path):
+    size = 0
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def dokku_git_mirror_evict(mirror_dir, max_size, keep=None):
+    """Remove least recently used mirrors until the cache fits in `max_size` bytes."""
+    mirrors = []
+    for entry in os.listdir(mirror_dir):
+        path = os.path.join(mirror_dir, entry)
+        if not entry.endswith(".git") or not os.path.isdir(path):
+            continue
+        mirrors.append((os.stat(path).st_mtime, path, dokku_git_mirror_size(path)))
+
+    evicted = []
+    total = sum(size for _mtime, _path, size in mirrors)
+    for _mtime, path, size in sorted(mirrors):
+        if total <= max_size:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        evicted.append(path)
+        total -= size
+
+    return evicted
+
+
+def dokku_git_mirror_update(repository, mirror_dir, max_size, owner="dokku"):
+    """Fetch `repository` into its bare mirror, cloning it on first use.
+
+    Returns the mirror path, which dokku can sync from instead of the remote.
+    """
+    if not os.path.isdir(mirror_dir):
+        os.makedirs(mirror_dir)
+
+    path = dokku_git_mirror_path(mirror_dir, repository)
+    with open("{0}.lock".format(path), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        if os.path.isdir(path):
+            command = ["git", "-C", path, "-c", "safe.directory={0}".format(path)]
+            command.extend(["remote", "update", "--prune"])
+        else:
+            command = ["git", "clone", "--mirror", repository, path]
+        try:
+            subprocess.check_output(command, stderr=subprocess.STDOUT)
+            if owner:
+                subprocess.check_output(
+                    ["chown", "-R", "{0}:{0}".format(owner), path],
+                    stderr=subprocess.STDOUT,
+                )
+        except (OSError, subprocess.CalledProcessError) as e:
+            return None, str(getattr(e, "output", None) or e)
+
+        # the mirror mtime drives the LRU eviction
+        os.utime(path, None)
+
+    dokku_git_mirror_evict(mirror_dir, max_size, keep=path)
+    return path, None
@@ -0,0 +1,30 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Shared functions for managing dokku services"""
+from ansible.module_utils.dokku_utils import subprocess_check_output
+
+
+def dokku_service_list(service):
+    """Get the names of all services of a given type with one `<service>:list`."""
+    command = "dokku --quiet {0}:list".format(service)
+    output, error = subprocess_check_output(command)
+    if error is not None:
+        return None, error
+
+    names = set()
+    for line in output:
+        # older plugin versions print a table header even when quiet
+        if line.startswith("=====>") or line.startswith("NAME "):
+            continue
+        names.add(line.split()[0])
+    return names, error
+
+
+def dokku_service_links(service, name):
+    """Get the apps linked to a service with one `<service>:links`."""
+    command = "dokku --quiet {0}:links {1}".format(service, name)
+    output, error = subprocess_check_output(command)
+    if error is not None:
+        return None, error
+
+    return set(line.split()[0] for line in output), error
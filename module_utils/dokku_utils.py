@@ -1,8 +1,13 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 """Utility functions for the dokku library"""
+import errno
+import fcntl
+import random
 import subprocess
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple
 
 
@@ -12,6 +17,28 @@ def force_list(var):
     return list(var)
 
 
+# Convert a property value the way dokku stores it, e.g. True to "true"
+# Unset values become an empty string
+def dokku_value_str(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+# Describe a failed command with its exit status and the output it captured
+def subprocess_error(e):
+    error = str(e)
+    output = e.output
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", "replace")
+    # keep what dokku printed, e.g. to tell a locked app from other failures
+    if output:
+        error = "{0} {1}".format(error, output.rstrip("\n"))
+    return error
+
+
 # Add an option to redirect stderr to stdout, because some dokku commands output to stderr
 def subprocess_check_output(command, split="\n", redirect_stderr=False):
     error = None
@@ -32,7 +59,7 @@ def subprocess_check_output(command, split="\n", redirect_stderr=False):
         output = force_list(filter(None, output))
         output = [o.strip() for o in output]
     except subprocess.CalledProcessError as e:
-        error = str(e)
+        error = subprocess_error(e) if redirect_stderr else str(e)
     return output, error
 
 
@@ -48,3 +75,157 @@ def get_dokku_version() -> Tuple[int, int, int]:
     version_data = match.group().split(".")
     version = tuple(map(int, version_data))
     return version
+
+
+# Run `func(item)` for each item on a thread pool, keeping the order of items
+# Each call must return an `(output, error)` tuple like subprocess_check_output
+def run_concurrently(func, items, parallelism=4):
+    items = list(items)
+    if len(items) == 0:
+        return []
+
+    parallelism = max(1, min(parallelism, len(items)))
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        return list(executor.map(func, items))
+
+
+# Errors printed by dokku when a command waits for or gives up on the deploy lock
+LOCK_ERRORS = ["deploy lock", "currently being deployed", "is locked"]
+LOCK_FILES = [
+    "/var/lib/dokku/data/apps/{0}/.deploy.lock",
+    "/home/dokku/{0}/.deploy.lock",
+]
+
+
+# Whether the deploy lock of an app is held by another dokku command
+# `error` is checked first, as failed commands do not always print the reason
+def dokku_app_locked(app, error=None):
+    if error is not None and any(m in str(error).lower() for m in LOCK_ERRORS):
+        return True
+
+    for path in LOCK_FILES:
+        try:
+            f = open(path.format(app))
+        except (IOError, OSError):
+            continue
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                fcntl.flock(f, fcntl.LOCK_UN)
+            except (IOError, OSError) as e:
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    return True
+    return False
+
+
+# Call `func()` until it does not fail on a locked app, at most `retries` times
+# more, waiting a random time of up to `backoff * 2^attempt` seconds in between
+def run_retrying(func, app, retries=3, backoff=2.0):
+    for attempt in range(retries + 1):
+        output, error = func()
+        if error is None or attempt == retries:
+            break
+        if not dokku_app_locked(app, error):
+            break
+        time.sleep(random.uniform(0, backoff * 2**attempt))
+    return output, error
+
+
+# Run `func(item)` for each item like run_concurrently, but never run two items
+# of the same app at once, and retry the calls that fail on a locked app up to
+# `retries` times, waiting a random time of up to `backoff * 2^attempt` seconds
+# `app_of(item)` returns the app of an item, items are app names by default
+# `serialize_by(item)` groups items that must not run at the same time, by app
+# by default. Functions should capture stderr so lock errors can be detected
+def run_per_app(
+    func,
+    items,
+    app_of=None,
+    serialize_by=None,
+    parallelism=4,
+    retries=3,
+    backoff=2.0,
+):
+    items = list(items)
+    if app_of is None:
+        app_of = str
+    if serialize_by is None:
+        serialize_by = app_of
+
+    # the items of a group run one after the other in the same worker
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault(serialize_by(item), []).append(index)
+
+    def run(group):
+        results = []
+        for index in groups[group]:
+            item = items[index]
+            result = run_retrying(
+                lambda: func(item), app_of(item), retries=retries, backoff=backoff
+            )
+            results.append((index, result))
+        return results, None
+
+    results = [None] * len(items)
+    for group_results, _ in run_concurrently(run, list(groups.keys()), parallelism):
+        for index, result in group_results:
+            results[index] = result
+    return results
+
+
+_REPORT_CACHE = {}
+
+
+# Parse `dokku <prefix>:report` into a map of app => {key: value}
+# Keys are normalized, e.g. "Network attach post create" => "attach-post-create"
+# Without an app, every app is reported by a single command
+def dokku_report(prefix, app=None, refresh=False):
+    cache_key = (prefix, app)
+    if cache_key in _REPORT_CACHE and not refresh:
+        return _REPORT_CACHE[cache_key], None
+
+    command = "dokku {0}:report".format(prefix)
+    if app is not None:
+        command += " {0}".format(app)
+    output, error = subprocess_check_output(command)
+    if error is not None:
+        return None, error
+
+    key_prefix = "{0}-".format(prefix)
+    report = {}
+    current = None
+    for line in output:
+        if line.startswith("=====>"):
+            current = report.setdefault(line.split()[1], {})
+            continue
+        if current is None or ":" not in line:
+            continue
+        key, value = line.split(":", 1)
+        key = "-".join(key.lower().split())
+        if key.startswith(key_prefix):
+            key = key.replace(key_prefix, "", 1)
+        current[key] = value.strip()
+
+    _REPORT_CACHE[cache_key] = report
+    if app is None:
+        for name, values in report.items():
+            _REPORT_CACHE.setdefault((prefix, name), {name: values})
+    return report, error
+
+
+# Get the current value of a report property, or `None` if it is unknown
+# Without an app, the global value is read from the report of any app
+def dokku_report_value(prefix, prop, app=None):
+    report, error = dokku_report(prefix, app)
+    if error or len(report) == 0:
+        return None
+    if app is None:
+        values = list(report.values())[0]
+        return values.get("global-{0}".format(prop))
+    return report.get(app, {}).get(prop)
+
+
+def dokku_report_forget(prefix, app=None):
+    _REPORT_CACHE.pop((prefix, app), None)
+    _REPORT_CACHE.pop((prefix, None), None)